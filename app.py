@@ -1,11 +1,34 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from src.api.routes import router
+from src.api.routes import router, retrain_jobs
+from src.registry import get_registry
+from src.database import db
 import uvicorn
 import os
 
-app = FastAPI(title="pipeline-app", version="0.1")
+def warm_up_model():
+    try:
+        get_registry().warm_up()
+    except Exception as e:
+        print(f"Model warm-up failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load and warm the model in a background thread so the server starts accepting requests
+    # immediately; /health answers 503 until the model is ready
+    app.state.warm_up = asyncio.get_running_loop().run_in_executor(None, warm_up_model)
+    # Connect to MongoDB in the background (retrying with backoff); data is served from the
+    # file store until the connection is up
+    db.start_background_connect()
+    yield
+    retrain_jobs.shutdown()
+    await db.close_async()
+
+app = FastAPI(title="pipeline-app", version="0.1", lifespan=lifespan)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -21,6 +44,13 @@ app.include_router(router, prefix="/api")
 def index(request: Request):
     return templates.TemplateResponse("pipeline.html", {"request": request})
 
+# Readiness check: 503 until the model registry has a loaded model; the database section reports
+# whether data is served from the file store fallback (not a failure)
+@app.get("/health", include_in_schema=False)
+def health():
+    status = get_registry().status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content={"model": status, "database": db.status()})
+
 # Ensure upload directory exists (optional for now)
 os.makedirs("data/uploaded", exist_ok=True)
 
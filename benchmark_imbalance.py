@@ -0,0 +1,78 @@
+"""Compare the class-imbalance strategies of preprocess_train_data by training cost and quality.
+
+Usage: python benchmark_imbalance.py [--sizes 464 5000 20000] [--epochs 5] [--strategies smote random class_weight]
+Each training set is a resample of data/train/train.csv. For every strategy and size a fresh
+process preprocesses the data (cache disabled), trains a new model for `epochs` epochs and
+evaluates it on data/test/test.csv. It reports the training rows after resampling, the
+preprocessing time, the mean fit time per epoch (first epoch excluded, it includes tracing),
+the peak RSS of the process and the weighted F1 from evaluate_model. Artifacts are written
+to a temporary directory.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+# Run in a fresh interpreter so max RSS reflects one strategy and size only
+TRAIN_SCRIPT = """
+import json, os, resource, sys, tempfile, time
+import pandas as pd
+import tensorflow as tf
+from src.preprocessing import preprocess_train_data, preprocess_test_data, training_class_weight
+from src.model import train_and_save_model, evaluate_model
+
+strategy, size, epochs = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+data = pd.read_csv('data/train/train.csv').sample(n=size, replace=True, random_state=size).reset_index(drop=True)
+data['STUDENTID'] = [f"I{i}" for i in range(size)]
+
+class EpochTimer(tf.keras.callbacks.Callback):
+    def on_epoch_begin(self, epoch, logs=None):
+        self.started = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.times.append(time.perf_counter() - self.started)
+
+with tempfile.TemporaryDirectory() as tmp:
+    paths = {'scaler_path': os.path.join(tmp, 'scaler.pkl'), 'modes_path': os.path.join(tmp, 'modes.pkl')}
+    started = time.perf_counter()
+    X_train, y_train, X_val, y_val = preprocess_train_data(data, save_dir=tmp, cache_dir='', imbalance_strategy=strategy, **paths)
+    preprocess_seconds = time.perf_counter() - started
+
+    timer = EpochTimer()
+    timer.times = []
+    model_path = os.path.join(tmp, 'model.keras')
+    train_and_save_model(X_train, y_train, model_save_path=model_path, epochs=epochs, X_val=X_val, y_val=y_val,
+                         callbacks=[timer], class_weight=training_class_weight(y_train, strategy))
+    X_test, y_test = preprocess_test_data('data/test/test.csv', **paths)
+    metrics = evaluate_model(X_test, y_test, model_path=model_path)
+
+epoch_times = timer.times[1:] or timer.times
+print(json.dumps({
+    'rows': len(X_train) + len(X_val),
+    'preprocess_s': preprocess_seconds,
+    'epoch_s': sum(epoch_times) / len(epoch_times),
+    'peak_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'f1': metrics['f1_score']
+}))
+"""
+
+def run(strategy, size, epochs) -> dict:
+    output = subprocess.run([sys.executable, "-c", TRAIN_SCRIPT, strategy, str(size), str(epochs)],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main(args):
+    print(f"{'strategy':<13} {'size':>6} {'train rows':>10} {'preprocess s':>13} {'s/epoch':>8} {'peak MiB':>9} {'weighted F1':>12}")
+    for size in args.sizes:
+        for strategy in args.strategies:
+            result = run(strategy, size, args.epochs)
+            print(f"{strategy:<13} {size:>6} {result['rows']:>10} {result['preprocess_s']:>13.2f} "
+                  f"{result['epoch_s']:>8.3f} {result['peak_mib']:>9.0f} {result['f1']:>12.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[464, 5000, 20000])
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--strategies", nargs="+", default=['smote', 'random', 'class_weight'],
+                        choices=['smote', 'random', 'class_weight'])
+    main(parser.parse_args())
@@ -0,0 +1,68 @@
+"""Check parity of the NumPy inference backend against Keras and compare their latency.
+
+Usage: python benchmark_inference.py [--rows 1000] [--repeats 200]
+Exits with status 1 if the NumPy probabilities or predicted classes diverge from Keras.
+"""
+import argparse
+import sys
+import time
+import joblib
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from src.inference import NumpyDenseModel
+from src.preprocessing import all_feature_names, columns_to_drop
+
+MODEL_PATH = 'models/model.keras'
+SCALER_PATH = 'models/scaler.pkl'
+TEST_PATH = 'data/test/test.csv'
+TOLERANCE = 1e-4
+
+def keras_predict(model, scaler, X):
+    return model.predict(np.clip(scaler.transform(X), -5, 5), verbose=0)
+
+def time_call(fn, repeats):
+    """Return the median wall time of fn() in milliseconds."""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return 1000 * float(np.median(timings))
+
+def main(args):
+    model = tf.keras.models.load_model(MODEL_PATH)
+    scaler = joblib.load(SCALER_PATH)
+    engine = NumpyDenseModel.from_keras(model, scaler)
+
+    # Parity on the test set plus random rows that exercise the clip bounds
+    features = [col for col in all_feature_names if col not in columns_to_drop]
+    X_test = pd.read_csv(TEST_PATH)[features].to_numpy(dtype=np.float64)
+    rng = np.random.default_rng(42)
+    X_random = rng.integers(0, 12, size=(args.rows, len(features))).astype(np.float64)
+    X = np.vstack([X_test, X_random])
+
+    expected = keras_predict(model, scaler, X)
+    actual = engine.predict(X)
+    max_diff = float(np.abs(expected - actual).max())
+    class_agreement = float(np.mean(expected.argmax(axis=1) == actual.argmax(axis=1)))
+    print(f"parity: {len(X)} rows, max |p_keras - p_numpy| = {max_diff:.2e}, class agreement = {class_agreement:.2%}")
+    parity_ok = max_diff <= TOLERANCE and class_agreement == 1.0
+
+    single = X_test[:1]
+    batch = X[:args.rows]
+    print(f"{'backend':<10} {'per-row (ms)':>14} {f'batch of {len(batch)} (ms)':>22}")
+    print(f"{'keras':<10} {time_call(lambda: keras_predict(model, scaler, single), args.repeats):>14.3f} "
+          f"{time_call(lambda: keras_predict(model, scaler, batch), max(1, args.repeats // 10)):>22.3f}")
+    print(f"{'numpy':<10} {time_call(lambda: engine.predict(single), args.repeats):>14.3f} "
+          f"{time_call(lambda: engine.predict(batch), max(1, args.repeats // 10)):>22.3f}")
+
+    if not parity_ok:
+        print(f"FAILED: NumPy backend diverges from Keras (tolerance {TOLERANCE})")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,61 @@
+"""Compare per-request prediction with the micro-batching dispatcher under concurrent load.
+
+Usage: python benchmark_microbatch.py [--concurrency 32] [--requests 2000] [--max-batch 32] [--max-wait-ms 2]
+"""
+import argparse
+import asyncio
+import time
+import numpy as np
+from src.batching import MicroBatcher
+from src.prediction import load_and_predict, predict_batch
+from src.registry import get_registry
+
+FEATURES = [2, 1, 2, 3, 1, 2, 1, 3, 2, 1, 4, 3, 2, 1, 3, 2, 4, 3, 2, 1, 2, 3, 1, 2, 3, 1, 2, 3, 4, 5]
+
+async def run_load(call, concurrency, total_requests):
+    """Fire total_requests calls from `concurrency` concurrent clients; return latencies and wall time."""
+    latencies = []
+    remaining = [total_requests]
+
+    async def client():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return np.array(latencies), time.perf_counter() - started
+
+def report(name, latencies, elapsed):
+    print(f"{name:<14} {len(latencies) / elapsed:>10.1f} req/s   "
+          f"p50 {1000 * np.percentile(latencies, 50):>8.2f} ms   "
+          f"p99 {1000 * np.percentile(latencies, 99):>8.2f} ms")
+
+async def main(args):
+    get_registry().warm_up()
+    loop = asyncio.get_running_loop()
+
+    async def per_request():
+        await loop.run_in_executor(None, load_and_predict, FEATURES)
+
+    batcher = MicroBatcher(predict_batch, max_batch_size=args.max_batch, max_wait_ms=args.max_wait_ms)
+
+    async def micro_batched():
+        await batcher.submit(FEATURES)
+
+    print(f"concurrency={args.concurrency} requests={args.requests}")
+    report("per-request", *await run_load(per_request, args.concurrency, args.requests))
+    report("micro-batched", *await run_load(micro_batched, args.concurrency, args.requests))
+    metrics = batcher.metrics()
+    print(f"mean batch size {metrics['mean_batch_size']:.1f}, largest {metrics['largest_batch']}, "
+          f"mean queue wait {metrics['mean_queue_wait_ms']:.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    asyncio.run(main(parser.parse_args()))
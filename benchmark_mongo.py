@@ -0,0 +1,113 @@
+"""Benchmark MongoDB writes of uploads and bulk loads of the collections.
+
+Usage: python benchmark_mongo.py [--uri mongodb://localhost:27017] [--mode write|load]
+       write: [--uploads 20] [--rows 500] [--batch-sizes 100 1000 5000]
+       load:  [--sizes 10000 100000 1000000] [--batch-sizes 1000 10000]
+Without --uri the benchmark runs against mongomock (an in-process stand-in, useful for
+checking behaviour; only a real mongod gives meaningful timings).
+write: every simulated upload adds `rows` new students; reports per-upload time of the old
+clear-and-reinsert of the whole history and of STUDENTID-keyed upserts of only the new rows.
+load: fills a collection with `size` documents and compares building a DataFrame from a list
+of dicts (the previous load_from_collection) with the batched loader into preallocated
+arrays, for all columns and for a two-column projection.
+It writes to a separate `student_grade_db_benchmark` database and drops it afterwards.
+"""
+import argparse
+import time
+import pandas as pd
+from src.database import Database
+
+BENCHMARK_DATABASE = "student_grade_db_benchmark"
+
+def make_client(uri):
+    if uri:
+        from pymongo import MongoClient
+        return MongoClient(uri)
+
+    from tests.mongomock_compat import mongomock_client
+    return mongomock_client()
+
+def make_upload(template, rows, index):
+    upload = template.sample(n=rows, replace=True, random_state=index).reset_index(drop=True)
+    upload['STUDENTID'] = [f"U{index}-{i}" for i in range(rows)]
+    return upload
+
+def run(client, template, args, strategy, batch_size):
+    client.drop_database(BENCHMARK_DATABASE)
+    database = Database(client=client, database_name=BENCHMARK_DATABASE)
+    database.connect()
+    history = []
+    timings = []
+    for index in range(1, args.uploads + 1):
+        upload = make_upload(template, args.rows, index)
+        history.append(upload)
+        started = time.perf_counter()
+        if strategy == 'reinsert':
+            database.clear_collection('train')
+            database.save_to_collection(pd.concat(history, ignore_index=True), 'train', batch_size=batch_size)
+        else:
+            database.upsert_to_collection(upload, 'train', batch_size=batch_size)
+        timings.append((time.perf_counter() - started) * 1000)
+    # Repeating the last upload must not change anything
+    if strategy == 'upsert':
+        repeat = database.upsert_to_collection(history[-1], 'train', batch_size=batch_size)
+        assert repeat['inserted'] == 0 and repeat['updated'] == 0, repeat
+    assert database.count_documents('train') == args.uploads * args.rows
+    client.drop_database(BENCHMARK_DATABASE)
+    return timings
+
+def run_writes(client, template, args):
+    print(f"{'strategy':<10} {'batch':>6} {'first ms':>9} {'last ms':>9} {'mean ms':>9}")
+    for strategy in ('reinsert', 'upsert'):
+        for batch_size in args.batch_sizes or [100, 1000, 5000]:
+            timings = run(client, template, args, strategy, batch_size)
+            print(f"{strategy:<10} {batch_size:>6} {timings[0]:>9.1f} {timings[-1]:>9.1f} {sum(timings) / len(timings):>9.1f}")
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+def run_loads(client, template, args):
+    columns = ['STUDY_HRS', 'GRADE']
+    print(f"{'documents':>9} {'method':<28} {'seconds':>8}")
+    for size in args.sizes:
+        client.drop_database(BENCHMARK_DATABASE)
+        # Fill the collection before Database.connect() builds the unique index (mongomock checks it per insert)
+        collection = client[BENCHMARK_DATABASE]['train']
+        records = make_upload(template, min(size, 10000), 0).to_dict(orient="records")
+        for start in range(0, size, len(records)):
+            chunk = [dict(record, STUDENTID=f"L{start + i}") for i, record in enumerate(records[:size - start])]
+            collection.insert_many(chunk, ordered=False)
+        database = Database(client=client, database_name=BENCHMARK_DATABASE)
+        database.connect()
+
+        reference, seconds = timed(lambda: pd.DataFrame(list(collection.find({}, {"_id": 0}))))
+        print(f"{size:>9} {'list of dicts':<28} {seconds:>8.2f}")
+        for batch_size in args.batch_sizes or [1000, 10000]:
+            loaded, seconds = timed(lambda: database.load_from_collection('train', batch_size=batch_size))
+            pd.testing.assert_frame_equal(loaded, reference[loaded.columns], check_dtype=False)
+            print(f"{size:>9} {f'bulk loader, batch {batch_size}':<28} {seconds:>8.2f}")
+            loaded, seconds = timed(lambda: database.load_from_collection('train', columns=columns, batch_size=batch_size))
+            print(f"{size:>9} {f'bulk loader, 2 columns':<28} {seconds:>8.2f}")
+        del reference, loaded
+    client.drop_database(BENCHMARK_DATABASE)
+
+def main(args):
+    client = make_client(args.uri)
+    template = pd.read_csv('data/train/train.csv')
+    print(f"backend: {'mongod at ' + args.uri if args.uri else 'mongomock'}")
+    if args.mode == 'load':
+        run_loads(client, template, args)
+    else:
+        run_writes(client, template, args)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uri", default=None)
+    parser.add_argument("--mode", choices=["write", "load"], default="write")
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=None)
+    main(parser.parse_args())
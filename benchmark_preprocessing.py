@@ -0,0 +1,47 @@
+"""Measure preprocess_train_data with and without the preprocessed-array cache.
+
+Usage: python benchmark_preprocessing.py [--sizes 464 10000 100000]
+Each training set is a resample of data/train/train.csv. For every size the script reports
+the time of an uncached run, of the first cached run (a miss that also writes the entry)
+and of a repeat run on the same data (a hit), and checks that the hit returns the same
+arrays. Scaler, modes and cache entries are written to a temporary directory.
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from src.preprocessing import preprocess_train_data
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+def main(args):
+    template = pd.read_csv('data/train/train.csv')
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {
+            'scaler_path': os.path.join(tmp, 'scaler.pkl'),
+            'modes_path': os.path.join(tmp, 'modes.pkl'),
+            'save_dir': tmp
+        }
+        # Import sklearn/imblearn outside the timings
+        preprocess_train_data(template, cache_dir='', **paths)
+        print(f"{'rows':>8} {'uncached s':>11} {'miss s':>8} {'hit s':>8}")
+        for size in args.sizes:
+            data = template.sample(n=size, replace=True, random_state=size).reset_index(drop=True)
+            data['STUDENTID'] = [f"P{i}" for i in range(size)]
+            cache_dir = os.path.join(tmp, f"cache-{size}")
+            reference, uncached = timed(lambda: preprocess_train_data(data, cache_dir='', **paths))
+            _, miss = timed(lambda: preprocess_train_data(data, cache_dir=cache_dir, **paths))
+            cached, hit = timed(lambda: preprocess_train_data(data, cache_dir=cache_dir, **paths))
+            for expected, actual in zip(reference, cached):
+                np.testing.assert_array_equal(expected, actual)
+            print(f"{size:>8} {uncached:>11.2f} {miss:>8.2f} {hit:>8.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[464, 10000, 100000])
+    main(parser.parse_args())
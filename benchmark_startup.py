@@ -0,0 +1,67 @@
+"""Measure cold-start cost of the API: import time and time to the first successful prediction.
+
+Usage: python benchmark_startup.py [--runs 3] [--port 8765]
+Each run uses a fresh interpreter, the same way an autoscaled container starts.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+import requests
+
+FEATURES = [2, 1, 2, 3, 1, 2, 1, 3, 2, 1, 4, 3, 2, 1, 3, 2, 4, 3, 2, 1, 2, 3, 1, 2, 3, 1, 2, 3, 4, 5]
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+
+def measure_import():
+    """Seconds spent in `import app` in a fresh interpreter."""
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+def wait_for(started, fn, timeout):
+    """Poll fn() until it returns True; return seconds elapsed since `started`."""
+    while time.perf_counter() - started < timeout:
+        try:
+            if fn():
+                return time.perf_counter() - started
+        except requests.RequestException:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError("Server did not become ready in time")
+
+def measure_server(port, timeout=120):
+    """Seconds from process launch until the server accepts requests and until the first prediction succeeds."""
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        # Any HTTP response means uvicorn is accepting connections
+        accepting = wait_for(started, lambda: requests.get(f"{base_url}/health", timeout=1).status_code > 0, timeout)
+        first_predict = wait_for(started, lambda: requests.post(f"{base_url}/api/predict", json={"features": FEATURES}, timeout=timeout).ok, timeout)
+        return accepting, first_predict
+    finally:
+        server.terminate()
+        server.wait()
+
+def main(args):
+    imports, accepting, first_predicts = [], [], []
+    for _ in range(args.runs):
+        imports.append(measure_import())
+        accept_time, predict_time = measure_server(args.port)
+        accepting.append(accept_time)
+        first_predicts.append(predict_time)
+
+    print(f"backend: {os.getenv('INFERENCE_BACKEND', 'keras')}, runs: {args.runs}")
+    print(f"import app:                  median {np.median(imports):.2f} s")
+    print(f"launch -> accepting requests: median {np.median(accepting):.2f} s")
+    print(f"launch -> first prediction:   median {np.median(first_predicts):.2f} s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    main(parser.parse_args())
@@ -0,0 +1,105 @@
+"""Compare upload ingest cost of the CSV rewrite and the columnar store append as history grows.
+
+Usage: python benchmark_store.py [--uploads 50] [--rows 500] [--ingest-sizes 20000 100000 400000]
+                          [--repeat-sizes 500 20000 100000]
+Each simulated upload is a copy of data/train/train.csv with fresh STUDENTIDs. The script
+reports the time of every 10th upload for merge_and_split_data (rewrites both CSVs) and
+append_and_split_data (writes one new partition per split), then the time to load the full
+train split versus only the two columns a scatter plot needs. Finally it reports the peak
+memory (max RSS of a fresh process) of ingesting single uploads of growing size, parsed
+whole as before versus streamed in chunks, and the time to re-submit an already ingested
+upload with and without the content-hash memo. Everything runs in a temporary directory.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+from src.preprocessing import merge_and_split_data, append_and_split_data, ingest_upload
+from src.store import ColumnarStore
+
+def make_upload(template, rows, index, path):
+    upload = template.sample(n=rows, replace=True, random_state=index).reset_index(drop=True)
+    upload['STUDENTID'] = [f"U{index}-{i}" for i in range(rows)]
+    upload.to_csv(path, index=False)
+
+# Run in a fresh interpreter so max RSS reflects one ingest only
+INGEST_SCRIPT = """
+import resource, sys
+from src.preprocessing import split_new_data, append_and_split_data
+from src.store import ColumnarStore
+mode, path, root = sys.argv[1:4]
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if mode == 'whole':
+    split_new_data(path)
+else:
+    append_and_split_data(path, ColumnarStore(root))
+print(baseline / 1024, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+"""
+
+def peak_ingest_memory(mode, path, root):
+    output = subprocess.run([sys.executable, "-c", INGEST_SCRIPT, mode, path, root],
+                            capture_output=True, text=True, check=True).stdout.split()
+    baseline, peak = float(output[-2]), float(output[-1])
+    return peak - baseline
+
+def main(args):
+    template = pd.read_csv('data/train/train.csv')
+    with tempfile.TemporaryDirectory() as tmp:
+        train_csv = os.path.join(tmp, 'csv', 'train.csv')
+        test_csv = os.path.join(tmp, 'csv', 'test.csv')
+        store = ColumnarStore(os.path.join(tmp, 'store'))
+        upload_path = os.path.join(tmp, 'upload.csv')
+
+        print(f"{'upload':>6} {'total rows':>10} {'csv rewrite ms':>15} {'store append ms':>16}")
+        for index in range(1, args.uploads + 1):
+            make_upload(template, args.rows, index, upload_path)
+            started = time.perf_counter()
+            merge_and_split_data(upload_path, train_csv, test_csv)
+            csv_ms = (time.perf_counter() - started) * 1000
+            started = time.perf_counter()
+            append_and_split_data(upload_path, store)
+            store_ms = (time.perf_counter() - started) * 1000
+            if index == 1 or index % 10 == 0:
+                print(f"{index:>6} {index * args.rows:>10} {csv_ms:>15.1f} {store_ms:>16.1f}")
+
+        columns = ['STUDY_HRS', 'GRADE']
+        for label, load in [
+            ("csv, all columns", lambda: pd.read_csv(train_csv)),
+            ("csv, 2 columns", lambda: pd.read_csv(train_csv, usecols=columns)),
+            ("store, all columns", lambda: store.read('train')),
+            ("store, 2 columns", lambda: store.read('train', columns)),
+        ]:
+            started = time.perf_counter()
+            rows = len(load())
+            print(f"read {label:<20} {rows:>8} rows {(time.perf_counter() - started) * 1000:>8.1f} ms")
+
+        print(f"{'upload rows':>11} {'whole MiB':>10} {'streamed MiB':>13}  (peak RSS above the interpreter baseline)")
+        for rows in args.ingest_sizes:
+            make_upload(template, rows, rows, upload_path)
+            whole = peak_ingest_memory('whole', upload_path, os.path.join(tmp, f"ingest-{rows}"))
+            streamed = peak_ingest_memory('streamed', upload_path, os.path.join(tmp, f"ingest-{rows}"))
+            print(f"{rows:>11} {whole:>10.1f} {streamed:>13.1f}")
+
+        print(f"{'upload rows':>11} {'first ms':>9} {'repeat ms':>10} {'memo repeat ms':>15}")
+        for rows in args.repeat_sizes:
+            make_upload(template, rows, rows, upload_path)
+            repeat_store = ColumnarStore(os.path.join(tmp, f"repeat-{rows}"))
+            timings = []
+            # First ingest, repeat through the full pass (every row skipped), repeat through the memo
+            for ingest in (ingest_upload, append_and_split_data, ingest_upload):
+                started = time.perf_counter()
+                report = ingest(upload_path, repeat_store)
+                timings.append((time.perf_counter() - started) * 1000)
+            assert report['duplicate'] and report['inserted'] == rows
+            print(f"{rows:>11} {timings[0]:>9.1f} {timings[1]:>10.1f} {timings[2]:>15.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uploads", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--ingest-sizes", type=int, nargs="+", default=[20000, 100000, 400000])
+    parser.add_argument("--repeat-sizes", type=int, nargs="+", default=[500, 20000, 100000])
+    main(parser.parse_args())
@@ -0,0 +1,61 @@
+"""Compare model.fit throughput on float64 NumPy arrays with the float32 tf.data input pipeline.
+
+Usage: python benchmark_training.py [--sizes 464] [--epochs 100] [--batch-size 32]
+Each training set is a resample of data/train/train.csv (464 rows is the shipped set),
+preprocessed as for training (SMOTE by default). For every size a fresh model is trained
+for `epochs` epochs on the arrays as before, and another one on make_dataset() pipelines
+as train_and_save_model now does. The script reports epochs/second (first epoch excluded,
+it includes tracing) and the final validation accuracy of both runs.
+"""
+import argparse
+import os
+import tempfile
+import time
+import pandas as pd
+import tensorflow as tf
+from src.preprocessing import preprocess_train_data
+from src.model import create_model, make_dataset
+
+class EpochTimer(tf.keras.callbacks.Callback):
+    def on_train_begin(self, logs=None):
+        self.times = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.started = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.times.append(time.perf_counter() - self.started)
+
+def fit(X_train, y_train, X_val, y_val, args, pipeline):
+    model = create_model(X_train.shape[1], y_train.shape[1])
+    timer = EpochTimer()
+    if pipeline:
+        history = model.fit(make_dataset(X_train, y_train, args.batch_size, shuffle=True), epochs=args.epochs,
+                            validation_data=make_dataset(X_val, y_val, args.batch_size), callbacks=[timer], verbose=0)
+    else:
+        history = model.fit(X_train, y_train, epochs=args.epochs, batch_size=args.batch_size,
+                            validation_data=(X_val, y_val), callbacks=[timer], verbose=0)
+    times = timer.times[1:] or timer.times
+    return len(times) / sum(times), history.history['val_accuracy'][-1]
+
+def main(args):
+    template = pd.read_csv('data/train/train.csv')
+    print(f"{'size':>6} {'train rows':>10} {'numpy epochs/s':>15} {'tf.data epochs/s':>17} {'speedup':>8} {'val acc numpy/tf.data':>22}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            data = template if size == len(template) else template.sample(n=size, replace=True, random_state=size)
+            X_train, y_train, X_val, y_val = preprocess_train_data(
+                data.reset_index(drop=True), scaler_path=os.path.join(tmp, 'scaler.pkl'),
+                modes_path=os.path.join(tmp, 'modes.pkl'), save_dir=tmp, cache_dir=''
+            )
+            numpy_rate, numpy_acc = fit(X_train, y_train, X_val, y_val, args, pipeline=False)
+            dataset_rate, dataset_acc = fit(X_train, y_train, X_val, y_val, args, pipeline=True)
+            print(f"{size:>6} {len(X_train):>10} {numpy_rate:>15.2f} {dataset_rate:>17.2f} "
+                  f"{dataset_rate / numpy_rate:>7.2f}x {f'{numpy_acc:.3f} / {dataset_acc:.3f}':>22}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[464])
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=32)
+    main(parser.parse_args())
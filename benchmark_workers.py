@@ -0,0 +1,102 @@
+"""Measure memory per worker and throughput as uvicorn workers scale from 1 to N.
+
+Usage: python benchmark_workers.py [--max-workers 4] [--backends keras shared] [--duration 10] [--clients 16]
+For each backend and worker count it starts `uvicorn app:app --workers N`, drives /api/predict
+from concurrent clients and reports RSS and PSS (proportional set size, which splits shared
+pages such as the memory-mapped weights between the processes mapping them) per worker.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+import psutil
+import requests
+
+FEATURES = [2, 1, 2, 3, 1, 2, 1, 3, 2, 1, 4, 3, 2, 1, 3, 2, 4, 3, 2, 1, 2, 3, 1, 2, 3, 1, 2, 3, 4, 5]
+
+def wait_until_warm(base_url, workers, timeout=180):
+    """Wait until enough consecutive /health checks succeed that every worker is likely warm."""
+    started = time.perf_counter()
+    streak = 0
+    while streak < 10 * workers:
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError("Workers did not become ready in time")
+        try:
+            ok = requests.get(f"{base_url}/health", timeout=5).status_code == 200
+        except requests.RequestException:
+            ok = False
+        streak = streak + 1 if ok else 0
+        if not ok:
+            time.sleep(0.2)
+
+def drive_load(base_url, clients, duration):
+    """Send predictions from `clients` threads for `duration` seconds; return requests/sec."""
+    completed = [0] * clients
+    deadline = time.perf_counter() + duration
+
+    def client(i):
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            # Vary the last feature so the prediction cache does not answer everything
+            features = FEATURES[:-1] + [int(time.perf_counter() * 1e6) % 1000]
+            if session.post(f"{base_url}/api/predict", json={"features": features}, timeout=30).ok:
+                completed[i] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(completed) / duration
+
+def worker_memory(server):
+    """RSS and PSS in MiB of every worker process (the server itself when running a single worker)."""
+    supervisor = psutil.Process(server.pid)
+    rss, pss = [], []
+    for process in [supervisor] + supervisor.children(recursive=True):
+        try:
+            info = process.memory_full_info()
+        except psutil.Error:
+            continue
+        # Skip the supervisor and helper processes (e.g. the multiprocessing resource tracker)
+        if info.rss < 50 * 1024 * 1024:
+            continue
+        rss.append(info.rss / 2**20)
+        pss.append(getattr(info, 'pss', info.rss) / 2**20)
+    return rss, pss
+
+def run(backend, workers, args):
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = {**os.environ, "INFERENCE_BACKEND": backend, "PREDICT_CACHE_SIZE": "0"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_warm(base_url, workers)
+        drive_load(base_url, args.clients, 1.0)
+        throughput = drive_load(base_url, args.clients, args.duration)
+        rss, pss = worker_memory(server)
+        print(f"{backend:<8} {workers:>7} {throughput:>10.1f} {np.mean(rss):>13.1f} {np.mean(pss):>13.1f} {np.sum(pss):>11.1f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main(args):
+    print(f"{'backend':<8} {'workers':>7} {'req/s':>10} {'RSS/worker':>13} {'PSS/worker':>13} {'PSS total':>11}  (MiB)")
+    for backend in args.backends:
+        for workers in range(1, args.max_workers + 1):
+            run(backend, workers, args)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--backends", nargs="+", default=["keras", "shared"])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8766)
+    main(parser.parse_args())
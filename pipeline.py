@@ -1,12 +1,17 @@
 import numpy as np
 from src.model import train_and_save_model, evaluate_model
+from src.export import export_quantized_models
 from src.prediction import load_and_predict
-from src.preprocessing import preprocess_train_data, preprocess_test_data
+from src.preprocessing import preprocess_train_data, preprocess_test_data, training_class_weight
 from src.visualization import generate_plot_data, get_available_features, generate_confusion_matrix_data
+from src.store import get_store
+
+# Columnar dataset store (imported from data/train/train.csv and data/test/test.csv on first use)
+store = get_store()
 
 # Preprocess the training and testing data
-X_train_scaled, y_train, X_val_scaled, y_val = preprocess_train_data('data/train/train.csv')
-X_test_scaled, y_test = preprocess_test_data('data/test/test.csv')
+X_train_scaled, y_train, X_val_scaled, y_val = preprocess_train_data(store.split('train'))
+X_test_scaled, y_test = preprocess_test_data(store.split('test'))
 
 # Train the model with explicit validation data
 model, history = train_and_save_model(
@@ -15,26 +20,30 @@ model, history = train_and_save_model(
     epochs=30,
     batch_size=32,
     X_val=X_val_scaled,
-    y_val=y_val
+    y_val=y_val,
+    class_weight=training_class_weight(y_train)  # None unless IMBALANCE_STRATEGY=class_weight
 )
 
 # Evaluate the model on test data
 metrics = evaluate_model(X_test_scaled, y_test, model_path='models/model.keras')
 
+# Export quantized TFLite models, publishing only those within the accuracy/F1 gate
+export_report = export_quantized_models(X_test_scaled, y_test, model_path='models/model.keras')
+
 # Get available readable feature names for visualization
 available_features = get_available_features()
 print("Available features for plotting:", available_features)
 
 # Generate plot data for training set (scatter plot)
 plot_data_train = generate_plot_data(
-    'data/train/train.csv',
+    store.split('train'),
     plot_type='scatter',
     features=['Cumulative GPA', 'Weekly Study Hours']
 )
 
 # Generate plot data for test set (boxplot)
 plot_data_test = generate_plot_data(
-    'data/test/test.csv',
+    store.split('test'),
     plot_type='boxplot',
     features=['Class Attendance']
 )
@@ -51,6 +60,7 @@ predictions = load_and_predict(new_data)
 # Output results
 print(f"Accuracy: {metrics['accuracy']}")
 print(f"Classification Report: {metrics['classification_report']}")
+print("TFLite Export:", export_report)
 print("Training Plot Data:", plot_data_train)
 print("Test Plot Data:", plot_data_test)
 print("Confusion Matrix Data:", confusion_data)
@@ -1,17 +1,22 @@
 # routes.py
-from fastapi import APIRouter, HTTPException, UploadFile, File, Body
+from fastapi import APIRouter, HTTPException, UploadFile, File, Body, Request
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
 from src.visualization import generate_plot_data, get_available_features, generate_confusion_matrix_data, all_columns_names, categorical_name_mapping
-from src.prediction import load_and_predict
-from src.preprocessing import merge_and_split_data, preprocess_train_data, preprocess_test_data
-from src.model import train_and_save_model, retrain_and_save_model, evaluate_model
-from src.database import db  # Import database module
+from src.prediction import load_and_predict, predict_batch, validate_feature_row
+from src.batching import MicroBatcher
+from src.cache import PredictionCache
+from src.jobs import RetrainJobManager, JobConflictError
+from src.preprocessing import ingest_upload, preprocess_test_data, all_feature_names, columns_to_drop
+from src.registry import get_registry
+from src.dataset import dataset_cache, sync_database
 import shutil
 import os
-import time
+import io
+import csv
+import json
 import joblib
-import pandas as pd
 
 router = APIRouter()
 
@@ -27,22 +32,37 @@ GRADE_MEANINGS = {
     'AA': 'Excellent'
 }
 
-# Default data paths
-TRAIN_DATA_PATH = "data/train/train.csv"
-TEST_DATA_PATH = "data/test/test.csv"
-UPLOADED_DATA_DIR = "data/uploaded"
-
-def get_data_source(train_path: str = TRAIN_DATA_PATH, test_path: str = TEST_DATA_PATH):
-    """Get train and test data from MongoDB if available, else from files."""
-    if db.is_connected():
-        train_data = db.load_from_collection("train")
-        test_data = db.load_from_collection("test")
-        if train_data is not None and not train_data.empty and test_data is not None and not test_data.empty:
-            return train_data, test_data
-    # Fallback to files
-    train_data = pd.read_csv(train_path) if os.path.exists(train_path) else pd.DataFrame(columns=all_columns_names + ['GRADE'])
-    test_data = pd.read_csv(test_path) if os.path.exists(test_path) else pd.DataFrame(columns=all_columns_names + ['GRADE'])
-    return train_data, test_data
+# Largest number of rows accepted by /predict/batch in one request
+PREDICT_MAX_BATCH_SIZE = int(os.getenv("PREDICT_MAX_BATCH_SIZE", "10000"))
+MODEL_FEATURES = [col for col in all_feature_names if col not in columns_to_drop]
+
+# Micro-batching of concurrent /predict calls
+PREDICT_MICROBATCH = os.getenv("PREDICT_MICROBATCH", "1") == "1"
+batcher = MicroBatcher(
+    predict_batch,
+    max_batch_size=int(os.getenv("PREDICT_MICROBATCH_MAX_SIZE", "32")),
+    max_wait_ms=float(os.getenv("PREDICT_MICROBATCH_MAX_WAIT_MS", "2"))
+)
+
+# Cache of /predict results, keyed on the features and the loaded model version (size 0 disables it)
+prediction_cache = PredictionCache(
+    max_size=int(os.getenv("PREDICT_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("PREDICT_CACHE_TTL_SECONDS", "3600"))
+)
+
+def get_data_source():
+    """Get train and test data from the process-level dataset cache (MongoDB if available, else files)."""
+    return dataset_cache.get()
+
+def refresh_model():
+    """Reload the serving model now that the artifacts on disk have changed."""
+    try:
+        get_registry().get()
+    except Exception as e:
+        print(f"Model refresh failed: {e}")
+
+# Background retraining; the serving model is reloaded when a job succeeds
+retrain_jobs = RetrainJobManager(on_complete=refresh_model)
 
 # Endpoint to get available features
 @router.get("/features")
@@ -72,13 +92,129 @@ class PredictionInput(BaseModel):
     features: List[int]
 
 @router.post("/predict")
-def predict(input: PredictionInput):
+async def predict(input: PredictionInput):
     try:
-        prediction = load_and_predict(input.features)
+        model_version = get_registry().current_version()
+        prediction = prediction_cache.get(input.features, model_version)
+        if prediction is not None:
+            return {"prediction": prediction, "meaning": GRADE_MEANINGS.get(prediction, "Unknown")}
+
+        if PREDICT_MICROBATCH:
+            try:
+                validate_feature_row(input.features)
+            except ValueError as e:
+                raise ValueError(f"Prediction error: {e}")
+            result = await batcher.submit(input.features)
+            if "error" in result:
+                raise ValueError(f"Prediction error: {result['error']}")
+            prediction = result["prediction"]
+        else:
+            prediction = await run_in_threadpool(load_and_predict, input.features)
+        prediction_cache.put(input.features, model_version, prediction)
         return {"prediction": prediction, "meaning": GRADE_MEANINGS.get(prediction, "Unknown")}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.get("/predict/metrics")
+def predict_metrics():
+    """Report /predict micro-batching batch sizes and prediction cache counters."""
+    return {"microbatching": PREDICT_MICROBATCH, **batcher.metrics(), "cache": prediction_cache.stats()}
+
+def _json_row(item):
+    """Extract a feature list from a JSON batch item (a list or a {"features": [...]} object)."""
+    if isinstance(item, dict):
+        if "features" not in item:
+            raise ValueError("Row object must have a 'features' field")
+        return item["features"]
+    return item
+
+def _parse_csv_rows(text):
+    """Parse CSV batch rows, using the header (if any) to pick the 30 model features by name.
+
+    The first row is a header only if it names model features; otherwise it is data, so a
+    typo in the first row of a headerless CSV is reported like any other bad row.
+    """
+    records = [record for record in csv.reader(io.StringIO(text)) if record]
+    if not records:
+        return [], {}
+    columns = None
+    header = [cell.strip() for cell in records[0]]
+    if any(col in header for col in MODEL_FEATURES):
+        records = records[1:]
+        missing = [col for col in MODEL_FEATURES if col not in header]
+        if missing:
+            raise ValueError(f"CSV header is missing model features: {missing}")
+        columns = [header.index(col) for col in MODEL_FEATURES]
+
+    rows, errors = [], {}
+    for i, record in enumerate(records):
+        try:
+            cells = [record[j] for j in columns] if columns is not None else record
+            rows.append([float(cell) for cell in cells])
+        except (ValueError, IndexError):
+            rows.append(None)
+            errors[i] = "Row must contain only numeric features"
+    return rows, errors
+
+def parse_batch_rows(body: bytes, content_type: str):
+    """Parse a JSON array, NDJSON or CSV request body into feature rows and per-row parse errors."""
+    text = body.decode("utf-8-sig")
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return _parse_csv_rows(text)
+
+    rows, errors = [], {}
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        for i, line in enumerate(line for line in text.splitlines() if line.strip()):
+            try:
+                rows.append(_json_row(json.loads(line)))
+            except ValueError as e:
+                rows.append(None)
+                errors[i] = f"Invalid row: {e}"
+        return rows, errors
+
+    payload = json.loads(text)
+    if isinstance(payload, dict):
+        payload = payload.get("rows")
+    if not isinstance(payload, list):
+        raise ValueError("JSON body must be an array of feature rows or {\"rows\": [...]}")
+    for i, item in enumerate(payload):
+        try:
+            rows.append(_json_row(item))
+        except ValueError as e:
+            rows.append(None)
+            errors[i] = str(e)
+    return rows, errors
+
+@router.post("/predict/batch")
+async def predict_batch_endpoint(request: Request):
+    """Predict grades for many rows sent as a JSON array, NDJSON or CSV body."""
+    try:
+        rows, errors = parse_batch_rows(await request.body(), request.headers.get("content-type"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse batch: {str(e)}")
+    if not rows:
+        raise HTTPException(status_code=400, detail="Batch contains no rows")
+    if len(rows) > PREDICT_MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch size {len(rows)} exceeds the maximum of {PREDICT_MAX_BATCH_SIZE} rows")
+
+    try:
+        results = await run_in_threadpool(predict_batch, rows)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    for result in results:
+        if result["row"] in errors:
+            result.pop("prediction", None)
+            result["error"] = errors[result["row"]]
+        elif "prediction" in result:
+            result["meaning"] = GRADE_MEANINGS.get(result["prediction"], "Unknown")
+    return {
+        "count": len(results),
+        "errors": sum(1 for result in results if "error" in result),
+        "results": results
+    }
+
 # Default visualizations endpoint
 @router.get("/visualizations/default")
 def get_default_visualizations():
@@ -122,13 +258,11 @@ def get_default_visualizations():
     ]
     visualizations = []
     train_data, _ = get_data_source()
-    temp_path = "temp_train.csv"
-    train_data.to_csv(temp_path, index=False)
-    
+
     for plot in default_plots:
         try:
             plot_data = generate_plot_data(
-                data_path=temp_path,
+                data_path=train_data,
                 plot_type=plot["plot_type"],
                 features=plot["features"]
             )
@@ -139,7 +273,6 @@ def get_default_visualizations():
             })
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error generating default visualization: {str(e)}")
-    os.remove(temp_path)
     return visualizations
 
 # Custom visualization endpoint
@@ -160,117 +293,115 @@ def get_custom_visualization(input: CustomVisualizationInput):
             raise HTTPException(status_code=400, detail=f"Invalid feature: {feature}")
     
     train_data, _ = get_data_source()
-    temp_path = "temp_train.csv"
-    train_data.to_csv(temp_path, index=False)
-    
+
     try:
         plot_data = generate_plot_data(
-            data_path=temp_path,
+            data_path=train_data,
             plot_type=input.plot_type,
             features=features
         )
-        os.remove(temp_path)
         return {"plot_data": plot_data}
     except Exception as e:
-        os.remove(temp_path) if os.path.exists(temp_path) else None
         raise HTTPException(status_code=500, detail=f"Error generating custom visualization: {str(e)}")
 
+async def _sync_upload(store) -> dict:
+    """sync_database after an upload has been committed to the store; a failure is reported, not raised.
+
+    The partitions MongoDB missed are written by the reconcile on reconnect or the next upload's sync.
+    """
+    try:
+        return await sync_database(store)
+    except Exception as e:
+        print(f"Error writing upload to MongoDB: {e}")
+        return {"error": str(e)}
+
 # Upload endpoint
 @router.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
-    """Upload a CSV file, save to MongoDB, merge with existing data, and split into train/test sets."""
+    """Upload a CSV file, split it into train/test, append it to the dataset store and save to MongoDB."""
     try:
         if not file.filename.endswith('.csv'):
             raise HTTPException(status_code=400, detail="Only CSV files are allowed")
 
-        # Save uploaded file temporarily
-        timestamp = int(time.time())
-        unique_filename = f"{timestamp}_{file.filename}"
-        file_path = os.path.join(UPLOADED_DATA_DIR, unique_filename)
-        os.makedirs(UPLOADED_DATA_DIR, exist_ok=True)
-        with open(file_path, "wb") as f:
-            f.write(await file.read())
-
-        # Validate and split data
-        train_path, test_path = merge_and_split_data(file_path, TRAIN_DATA_PATH, TEST_DATA_PATH)
-        os.remove(file_path)
-
-        # Save to MongoDB if connected
-        if db.is_connected():
-            train_data = pd.read_csv(train_path)
-            test_data = pd.read_csv(test_path)
-            db.clear_collection("train")
-            db.clear_collection("test")
-            db.save_to_collection(train_data, "train")
-            db.save_to_collection(test_data, "test")
-
-        return {"message": f"Data uploaded, merged, and split into {train_path} and {test_path}"}
+        # Hash the (spooled) upload; unless identical content was already ingested, stream it into
+        # the store chunk by chunk: validate, deduplicate against the stored students and append
+        # new/changed rows as partitions
+        store = dataset_cache.store
+        report = await run_in_threadpool(ingest_upload, file.file, store)
+        if report["duplicate"]:
+            return {
+                "message": "This file was already uploaded; nothing changed",
+                **report,
+                # Still catch MongoDB up if it missed earlier uploads
+                "mongo_sync": await _sync_upload(store)
+            }
+
+        # Write the partitions MongoDB is missing (this upload's, plus any from an outage) if connected
+        mongo_sync = await _sync_upload(store)
+        # Cached train/test frames are stale now
+        if any(report["partitions"].values()):
+            dataset_cache.invalidate()
+
+        return {
+            "message": (
+                f"Data uploaded: {report['inserted']} new, {report['updated']} updated, "
+                f"{report['skipped']} unchanged and {report['dropped']} rows without a grade"
+            ),
+            **report,
+            "mongo_sync": mongo_sync
+        }
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error uploading file: {str(e)}")
 
-# Retrain endpoint
-@router.post("/retrain")
-async def retrain():
-    """Retrain the model using data from MongoDB or files."""
+@router.get("/data/info")
+def data_info():
+    """Report the data version and row counts of the cached train/test sets."""
     try:
-        model_path = "models/model.keras"
-        backup_path = "models/model_backup.keras"
-        old_metrics = None
-
-        # Get test data
-        _, test_data = get_data_source()
-        temp_test_path = "temp_test.csv"
-        test_data.to_csv(temp_test_path, index=False)
-
-        if os.path.exists(model_path):
-            shutil.copy(model_path, backup_path)
-            X_test_scaled_old, y_test_onehot_old = preprocess_test_data(temp_test_path)
-            old_metrics = evaluate_model(X_test_scaled_old, y_test_onehot_old)
-            old_metrics = {key: value for key, value in old_metrics.items() if key not in ['y_true', 'y_pred']}
-
-        # Get train data
-        train_data, _ = get_data_source()
-        temp_train_path = "temp_train.csv"
-        train_data.to_csv(temp_train_path, index=False)
-
-        X_train_scaled, y_train_onehot, X_val_scaled, y_val_onehot = preprocess_train_data(temp_train_path)
-
-        if os.path.exists(model_path):
-            retrain_and_save_model(X_train_scaled, y_train_onehot, X_val=X_val_scaled, y_val=y_val_onehot)
-        else:
-            train_and_save_model(X_train_scaled, y_train_onehot, X_val=X_val_scaled, y_val=y_val_onehot)
-
-        X_test_scaled_new, y_test_onehot_new = preprocess_test_data(temp_test_path)
-        new_metrics = evaluate_model(X_test_scaled_new, y_test_onehot_new)
-        new_metrics = {key: value for key, value in new_metrics.items() if key not in ['y_true', 'y_pred']}
+        dataset_cache.get()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading data: {str(e)}")
+    return dataset_cache.info()
 
-        os.remove(temp_train_path)
-        os.remove(temp_test_path)
+# Retrain endpoint
+@router.post("/retrain", status_code=202)
+async def retrain(mode: str = "auto"):
+    """Start retraining on data from MongoDB or files in a background worker process; returns the job ID.
 
-        return {
-            "message": "Model retrained successfully",
-            "old_metrics": old_metrics,
-            "new_metrics": new_metrics
-        }
+    mode=auto fine-tunes the current model on only the rows added since it was trained when
+    possible; mode=full always retrains on the whole training set.
+    """
+    try:
+        train_data, test_data = await run_in_threadpool(get_data_source)
+        job = retrain_jobs.submit(train_data, test_data, mode)
+    except JobConflictError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "job": e.job})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return {**job, "status_url": f"/api/retrain/{job['job_id']}"}
+
+@router.get("/retrain/{job_id}")
+def retrain_status(job_id: str):
+    """Report the status, epoch progress and (when finished) old/new metrics of a retrain job."""
+    job = retrain_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown retrain job: {job_id}")
+    return job
 
 # Evaluate endpoint
 @router.get("/evaluate")
-async def evaluate():
+def evaluate():
     """Evaluate the current model on the test data from MongoDB or files."""
+    from src.model import evaluate_model
+
     try:
         _, test_data = get_data_source()
-        temp_test_path = "temp_test.csv"
-        test_data.to_csv(temp_test_path, index=False)
 
-        X_test_scaled, y_test_onehot = preprocess_test_data(temp_test_path)
+        X_test_scaled, y_test_onehot = preprocess_test_data(test_data)
         metrics = evaluate_model(X_test_scaled, y_test_onehot)
         y_true = metrics.pop('y_true')
         y_pred = metrics.pop('y_pred')
         confusion_data = generate_confusion_matrix_data(y_true, y_pred)
 
-        os.remove(temp_test_path)
         return {
             "metrics": metrics,
             "confusion_matrix": confusion_data
@@ -281,16 +412,28 @@ async def evaluate():
 # Save retrain endpoint
 @router.post("/save_retrain")
 async def save_retrain(save: bool = Body(..., embed=False)):
+    from src.export import restore_tflite_models
+    from src.manifest import restore_manifest
+    from src.preprocessing import restore_preprocessing
+
     try:
         backup_path = "models/model_backup.keras"
         model_path = "models/model.keras"
         if save:
             if os.path.exists(backup_path):
                 os.remove(backup_path)
+                restore_tflite_models(restore=False)
+                restore_preprocessing(restore=False)
+                restore_manifest(restore=False)
             return {"message": "New model saved"}
         else:
             if os.path.exists(backup_path):
+                # The model goes back last so it is never served with the new scaler
+                restore_tflite_models(restore=True)
+                restore_preprocessing(restore=True)
+                restore_manifest(restore=True)
                 shutil.move(backup_path, model_path)
+                refresh_model()
             return {"message": "Reverted to previous model"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+
+# Upper bounds of the batch-size histogram buckets reported in metrics
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+class MicroBatcher:
+    """Coalesce concurrent single-row predictions into one batched forward pass.
+
+    Callers await submit(row); a dispatcher task collects queued rows until max_batch_size
+    rows are waiting or max_wait_ms has passed, runs predict_fn once over all of them in a
+    worker thread and resolves each caller's future with its own result. While traffic is
+    sequential (the previous batch held a single row) rows are dispatched immediately, so the
+    wait window is only paid once requests actually overlap.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=2.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._loop = None
+        self._queue = None
+        self._task = None
+        self._last_batch_size = 1
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._batches = 0
+        self._rows = 0
+        self._max_batch = 0
+        self._queue_wait_total = 0.0
+        self._inference_total = 0.0
+        self._histogram = {bound: 0 for bound in BATCH_SIZE_BUCKETS}
+        self._histogram_overflow = 0
+
+    def _ensure_started(self):
+        """Start the dispatcher task on the running event loop (restarting it if the loop changed)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, row):
+        """Queue one feature row and wait for its prediction result."""
+        self._ensure_started()
+        future = self._loop.create_future()
+        await self._queue.put((row, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        """Wait for the first row, then gather more until the batch is full or the window closes."""
+        batch = [await self._queue.get()]
+        if self._queue.empty() and self._last_batch_size == 1:
+            return batch
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            rows = [row for row, _, _ in batch]
+            started = time.perf_counter()
+            try:
+                results = await self._loop.run_in_executor(None, self.predict_fn, rows)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self._last_batch_size = len(batch)
+            self._record(batch, started, finished)
+
+    def _record(self, batch, started, finished):
+        size = len(batch)
+        with self._stats_lock:
+            self._batches += 1
+            self._rows += size
+            self._max_batch = max(self._max_batch, size)
+            self._queue_wait_total += sum(started - queued_at for _, _, queued_at in batch)
+            self._inference_total += finished - started
+            for bound in BATCH_SIZE_BUCKETS:
+                if size <= bound:
+                    self._histogram[bound] += 1
+                    break
+            else:
+                self._histogram_overflow += 1
+
+    def metrics(self) -> dict:
+        """Return achieved batch sizes, queueing delay and inference time."""
+        with self._stats_lock:
+            histogram = {f"<={bound}": count for bound, count in self._histogram.items()}
+            histogram[f">{BATCH_SIZE_BUCKETS[-1]}"] = self._histogram_overflow
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait_ms,
+                'batches': self._batches,
+                'rows': self._rows,
+                'mean_batch_size': self._rows / self._batches if self._batches else 0.0,
+                'largest_batch': self._max_batch,
+                'mean_queue_wait_ms': 1000.0 * self._queue_wait_total / self._rows if self._rows else 0.0,
+                'mean_inference_ms': 1000.0 * self._inference_total / self._batches if self._batches else 0.0,
+                'batch_size_histogram': histogram
+            }
+
+    def reset_metrics(self):
+        with self._stats_lock:
+            self._reset_stats()
@@ -1,10 +1,17 @@
 # src/database.py
+import asyncio
+import itertools
+import operator
 import os
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+import threading
+import time
+from pymongo import AsyncMongoClient, MongoClient, ReturnDocument, ReplaceOne
+from pymongo.errors import ConnectionFailure, OperationFailure, PyMongoError
 from dotenv import load_dotenv
+import numpy as np
 import pandas as pd
 from typing import List, Dict, Optional
+from src.schema import COLUMNS, get_schema
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,64 +21,420 @@ MONGODB_URI = os.getenv("MONGODB_URI")
 DATABASE_NAME = "student_grade_db"
 TRAIN_COLLECTION = "train"
 TEST_COLLECTION = "test"
+META_COLLECTION = "meta"
+# Meta document listing, per split, the store partitions already written to MongoDB
+SYNC_META_ID = "store_sync"
+
+# Documents are keyed on the student ID (unique index in each data collection)
+KEY_COLUMN = "STUDENTID"
+# Operations sent per bulk write; unordered batches of ~1000 keep round trips low without huge requests
+BULK_BATCH_SIZE = int(os.getenv("MONGO_BULK_BATCH_SIZE", "1000"))
+# Documents per cursor batch when loading a collection
+LOAD_BATCH_SIZE = int(os.getenv("MONGO_LOAD_BATCH_SIZE", "10000"))
+# Client timeouts and pool size; a dead server fails a connection attempt within seconds instead of ~30 s
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "3000"))
+CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "3000"))
+SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+# Seconds between background reconnection attempts (doubling from 1 s up to this value)
+RETRY_MAX_SECONDS = float(os.getenv("MONGO_RETRY_MAX_SECONDS", "60"))
+# Opt-in migration: when the unique STUDENTID index cannot be built because a collection holds a
+# student more than once, delete all but the latest document of each student and retry
+DROP_DUPLICATE_KEYS = os.getenv("MONGO_DROP_DUPLICATE_KEYS", "0") == "1"
 
 # Expected columns for validation
-EXPECTED_COLUMNS = [
-    'STUDENTID', 'AGE', 'GENDER', 'HS_TYPE', 'SCHOLARSHIP', 'WORK', 'ACTIVITY', 'PARTNER', 
-    'SALARY', 'TRANSPORT', 'LIVING', 'MOTHER_EDU', 'FATHER_EDU', '#_SIBLINGS', 
-    'KIDS', 'MOTHER_JOB', 'FATHER_JOB', 'STUDY_HRS', 'READ_FREQ', 'READ_FREQ_SCI', 
-    'ATTEND_DEPT', 'IMPACT', 'ATTEND', 'PREP_STUDY', 'PREP_EXAM', 'NOTES', 
-    'LISTENS', 'LIKES_DISCUSS', 'CLASSROOM', 'CUML_GPA', 'EXP_GPA', 'COURSE ID', 'GRADE'
-]
+EXPECTED_COLUMNS = COLUMNS
+# Columns holding strings; all others are numeric
+TEXT_COLUMNS = ['STUDENTID']
 
 class Database:
-    def __init__(self):
-        """Initialize MongoDB client."""
-        try:
-            self.client = MongoClient(MONGODB_URI)
-            self.db = self.client[DATABASE_NAME]
-            # Test connection
-            self.client.server_info()
-            self.connected = True
-        except ConnectionFailure:
-            print("Failed to connect to MongoDB. Using file-based fallback.")
-            self.connected = False
+    def __init__(self, uri: Optional[str] = MONGODB_URI, client=None, database_name: str = DATABASE_NAME,
+                 async_client=None):
+        """Configure the MongoDB client; the connection is made in the background on first use.
+
+        An existing client (e.g. mongomock.MongoClient()) may be injected instead of a URI. The
+        async methods use async_client (or an AsyncMongoClient opened from the URI); with an
+        injected sync client and no async client they run the sync methods in a worker thread.
+        """
+        self.uri = uri
+        self.client = client
+        self.async_client = async_client
+        self._owns_client = False
+        self.database_name = database_name
+        self.db = None
+        self._async_db = None
+        self.connected = False
+        self.last_error = None
+        self.last_attempt = None
+        self.attempts = 0
+        self.index_errors = {}
+        self._connect_callbacks = []
+        self._lock = threading.Lock()
+        self._retry_thread = None
+        self._stop = threading.Event()
+
+    def _client_options(self) -> dict:
+        return {
+            "serverSelectionTimeoutMS": SERVER_SELECTION_TIMEOUT_MS,
+            "connectTimeoutMS": CONNECT_TIMEOUT_MS,
+            "socketTimeoutMS": SOCKET_TIMEOUT_MS,
+            "maxPoolSize": MAX_POOL_SIZE
+        }
+
+    def connect(self) -> bool:
+        """Make one connection attempt (blocks for at most the server selection timeout)."""
+        with self._lock:
+            if self.connected:
+                return True
+            self.attempts += 1
+            self.last_attempt = time.time()
+            try:
+                if self.client is None:
+                    self.client = MongoClient(self.uri, **self._client_options())
+                    self._owns_client = True
+                self.db = self.client[self.database_name]
+                # Test connection
+                self.client.server_info()
+                self.ensure_indexes()
+                self.connected = True
+                self.last_error = None
+                if self.attempts > 1:
+                    print(f"Connected to MongoDB after {self.attempts} attempts")
+            except PyMongoError as e:
+                if self.attempts == 1:
+                    print("Failed to connect to MongoDB. Using file-based fallback.")
+                self.last_error = str(e)
+                return False
+        self._run_connect_callbacks()
+        return True
+
+    def add_connect_callback(self, callback) -> None:
+        """Call callback() once the connection is up (right away if it already is)."""
+        self._connect_callbacks.append(callback)
+        if self.connected:
+            self._run_connect_callbacks([callback])
+
+    def _run_connect_callbacks(self, callbacks=None) -> None:
+        for callback in callbacks or self._connect_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in MongoDB connect callback: {e}")
+
+    def start_background_connect(self) -> None:
+        """Start the retry thread that connects with exponential backoff; no-op if already started."""
+        with self._lock:
+            if self._retry_thread is not None or self.connected:
+                return
+            self._retry_thread = threading.Thread(target=self._connect_loop, name="mongodb-connect", daemon=True)
+            self._retry_thread.start()
+
+    def _connect_loop(self) -> None:
+        delay = 1.0
+        while not self._stop.is_set() and not self.connect():
+            self._stop.wait(delay)
+            delay = min(delay * 2, RETRY_MAX_SECONDS)
 
     def is_connected(self) -> bool:
-        """Check if the database is connected."""
+        """Check if the database is connected without blocking; the first call starts connecting in the background."""
+        if not self.connected:
+            self.start_background_connect()
         return self.connected
 
+    def status(self) -> dict:
+        """Connection state for health checks; fallback is True while data is served from the file store."""
+        return {
+            "connected": self.connected,
+            "fallback": not self.connected,
+            "attempts": self.attempts,
+            "last_attempt": self.last_attempt,
+            "last_error": self.last_error,
+            "index_errors": self.index_errors
+        }
+
+    async def close_async(self) -> None:
+        """Stop reconnecting and close the clients opened from the URI."""
+        self._stop.set()
+        if self._owns_client:
+            if self.async_client is not None:
+                await self.async_client.close()
+            if self.client is not None:
+                self.client.close()
+        self.connected = False
+
+    def _get_async_db(self):
+        """Database handle on the async client, or None when only a sync client was injected."""
+        if self._async_db is None:
+            if self.async_client is None and self._owns_client:
+                self.async_client = AsyncMongoClient(self.uri, **self._client_options())
+            if self.async_client is not None:
+                self._async_db = self.async_client[self.database_name]
+        return self._async_db
+
     def validate_data(self, df: pd.DataFrame) -> None:
-        """Validate that the DataFrame matches expected columns and has no nulls."""
-        if list(df.columns) != EXPECTED_COLUMNS:
-            raise ValueError(f"Data must have columns: {EXPECTED_COLUMNS}")
-        if df.isnull().any().any():
-            raise ValueError("Data contains missing values")
-
-    def save_to_collection(self, df: pd.DataFrame, collection_name: str) -> None:
-        """Save DataFrame to a MongoDB collection."""
-        if not self.connected:
+        """Check the column layout; rows come from the store, whose uploads were validated at ingest."""
+        get_schema().check_columns(df)
+
+    def ensure_indexes(self) -> None:
+        """Create the unique STUDENTID index on the data collections.
+
+        Collections written before the index existed may hold a student more than once. Their
+        documents are kept and the collection stays unindexed (reported in status()) unless
+        MONGO_DROP_DUPLICATE_KEYS=1 opts in to removing the older duplicates.
+        """
+        for collection_name in (TRAIN_COLLECTION, TEST_COLLECTION):
+            collection = self.db[collection_name]
+            try:
+                collection.create_index(KEY_COLUMN, unique=True)
+                self.index_errors.pop(collection_name, None)
+            except OperationFailure as e:
+                if not DROP_DUPLICATE_KEYS:
+                    self.index_errors[collection_name] = str(e)
+                    print(f"Error creating unique {KEY_COLUMN} index on '{collection_name}' (duplicate students kept; "
+                          f"set MONGO_DROP_DUPLICATE_KEYS=1 to remove them): {e}")
+                    continue
+                removed = self._drop_duplicate_keys(collection)
+                print(f"Removed {removed} duplicate students from '{collection_name}' before indexing")
+                collection.create_index(KEY_COLUMN, unique=True)
+                self.index_errors.pop(collection_name, None)
+
+    def _drop_duplicate_keys(self, collection) -> int:
+        """Keep only the most recently inserted document of every student."""
+        duplicates = collection.aggregate([
+            {"$group": {"_id": f"${KEY_COLUMN}", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}}
+        ])
+        stale_ids = []
+        for group in duplicates:
+            stale_ids.extend(sorted(group["ids"])[:-1])
+        for start in range(0, len(stale_ids), BULK_BATCH_SIZE):
+            collection.delete_many({"_id": {"$in": stale_ids[start:start + BULK_BATCH_SIZE]}})
+        return len(stale_ids)
+
+    def save_to_collection(self, df: pd.DataFrame, collection_name: str, batch_size: int = BULK_BATCH_SIZE) -> int:
+        """Insert the DataFrame rows into a MongoDB collection as new documents; returns the number inserted."""
+        if not self.is_connected():
             raise ConnectionFailure("Database not connected")
         self.validate_data(df)
         collection = self.db[collection_name]
         records = df.to_dict(orient="records")
-        if records:
-            collection.insert_many(records)
+        inserted = 0
+        for start in range(0, len(records), batch_size):
+            result = collection.insert_many(records[start:start + batch_size], ordered=False)
+            inserted += len(result.inserted_ids)
+        return inserted
 
-    def load_from_collection(self, collection_name: str) -> Optional[pd.DataFrame]:
-        """Load data from a MongoDB collection into a DataFrame."""
-        if not self.connected:
+    def upsert_to_collection(self, df: pd.DataFrame, collection_name: str, batch_size: int = BULK_BATCH_SIZE) -> Dict[str, int]:
+        """Insert or replace the DataFrame rows keyed on STUDENTID; safe to repeat with the same rows.
+
+        Rows are sent as unordered bulk writes of batch_size ReplaceOne upserts. If a student
+        appears more than once, the last row wins. Returns counts of inserted, updated
+        (changed) and unchanged documents.
+        """
+        if not self.is_connected():
+            raise ConnectionFailure("Database not connected")
+        self.validate_data(df)
+        collection = self.db[collection_name]
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        for requests in _upsert_batches(df, batch_size):
+            _add_write_counts(counts, collection.bulk_write(requests, ordered=False))
+        return counts
+
+    async def upsert_to_collection_async(self, df: pd.DataFrame, collection_name: str,
+                                         batch_size: int = BULK_BATCH_SIZE) -> Dict[str, int]:
+        """upsert_to_collection on the async client, for the API routes."""
+        if not self.is_connected():
+            raise ConnectionFailure("Database not connected")
+        database = self._get_async_db()
+        if database is None:
+            return await asyncio.to_thread(self.upsert_to_collection, df, collection_name, batch_size)
+        self.validate_data(df)
+        collection = database[collection_name]
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        for requests in _upsert_batches(df, batch_size):
+            _add_write_counts(counts, await collection.bulk_write(requests, ordered=False))
+        return counts
+
+    def count_documents(self, collection_name: str) -> int:
+        """Estimated number of documents in a collection (0 when not connected)."""
+        if not self.is_connected():
+            return 0
+        return self.db[collection_name].estimated_document_count()
+
+    async def count_documents_async(self, collection_name: str) -> int:
+        """count_documents on the async client."""
+        if not self.is_connected():
+            return 0
+        database = self._get_async_db()
+        if database is None:
+            return await asyncio.to_thread(self.count_documents, collection_name)
+        return await database[collection_name].estimated_document_count()
+
+    def load_from_collection(self, collection_name: str, columns: Optional[List[str]] = None,
+                             batch_size: int = LOAD_BATCH_SIZE) -> Optional[pd.DataFrame]:
+        """Load data (optionally only some columns) from a MongoDB collection into a DataFrame.
+
+        The cursor is streamed in batches of batch_size documents with a projection of the
+        requested columns, and each batch is written straight into preallocated typed column
+        arrays instead of building a list of dicts. Numeric columns come back as int64 when
+        every value is integral, else float64 (missing values become NaN).
+        """
+        if not self.is_connected():
             return None
+        columns = list(columns or EXPECTED_COLUMNS)
         collection = self.db[collection_name]
-        data = list(collection.find({}, {"_id": 0}))  # Exclude MongoDB _id field
-        if not data:
-            return pd.DataFrame(columns=EXPECTED_COLUMNS)
-        return pd.DataFrame(data)
+        text_columns = [col for col in columns if col in TEXT_COLUMNS]
+        numeric_columns = [col for col in columns if col not in TEXT_COLUMNS]
+
+        # Preallocate for the estimated size; grown or trimmed once the cursor is exhausted
+        capacity = max(collection.estimated_document_count(), 1)
+        numeric = np.empty((capacity, len(numeric_columns)), dtype=np.float64, order='F')
+        text = np.empty((capacity, len(text_columns)), dtype=object, order='F')
+        get_numeric = _row_getter(numeric_columns)
+        get_text = _row_getter(text_columns)
+
+        projection = {col: 1 for col in columns}
+        projection["_id"] = 0  # Exclude MongoDB _id field
+        cursor = collection.find({}, projection, batch_size=batch_size)
+        size = 0
+        while True:
+            batch = list(itertools.islice(cursor, batch_size))
+            if not batch:
+                break
+            end = size + len(batch)
+            if end > capacity:
+                capacity = max(end, 2 * capacity)
+                numeric = _grow(numeric, capacity)
+                text = _grow(text, capacity)
+            if numeric_columns:
+                numeric[size:end] = _numeric_block(batch, get_numeric, numeric_columns)
+            if text_columns:
+                text[size:end] = [get_text(doc) for doc in batch]
+            size = end
+
+        if size == 0:
+            return pd.DataFrame(columns=columns)
+        data = {}
+        for i, col in enumerate(numeric_columns):
+            values = numeric[:size, i]
+            is_integral = not np.isnan(values).any() and np.array_equal(values, np.trunc(values))
+            data[col] = values.astype(np.int64) if is_integral else values
+        for i, col in enumerate(text_columns):
+            data[col] = text[:size, i]
+        return pd.DataFrame(data, columns=columns)
 
     def clear_collection(self, collection_name: str) -> None:
         """Clear all data from a collection."""
-        if self.connected:
+        if self.is_connected():
             self.db[collection_name].delete_many({})
 
-# Singleton instance
+    def bump_data_version(self) -> Optional[int]:
+        """Increment the data version counter after the collections were rewritten."""
+        if not self.is_connected():
+            return None
+        meta = self.db[META_COLLECTION].find_one_and_update(
+            {"_id": "data_version"}, {"$inc": {"value": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return meta["value"]
+
+    async def bump_data_version_async(self) -> Optional[int]:
+        """bump_data_version on the async client."""
+        if not self.is_connected():
+            return None
+        database = self._get_async_db()
+        if database is None:
+            return await asyncio.to_thread(self.bump_data_version)
+        meta = await database[META_COLLECTION].find_one_and_update(
+            {"_id": "data_version"}, {"$inc": {"value": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return meta["value"]
+
+    def synced_partitions(self) -> Dict[str, list]:
+        """Store partitions already written to MongoDB, per split."""
+        if not self.is_connected():
+            return {}
+        meta = self.db[META_COLLECTION].find_one({"_id": SYNC_META_ID}) or {}
+        return {key: value for key, value in meta.items() if key != "_id"}
+
+    async def synced_partitions_async(self) -> Dict[str, list]:
+        """synced_partitions on the async client."""
+        if not self.is_connected():
+            return {}
+        database = self._get_async_db()
+        if database is None:
+            return await asyncio.to_thread(self.synced_partitions)
+        meta = await database[META_COLLECTION].find_one({"_id": SYNC_META_ID}) or {}
+        return {key: value for key, value in meta.items() if key != "_id"}
+
+    def mark_synced(self, split: str, partitions: List[str]) -> None:
+        """Record store partitions of a split as written to MongoDB."""
+        self.db[META_COLLECTION].update_one(
+            {"_id": SYNC_META_ID}, {"$addToSet": {split: {"$each": list(partitions)}}}, upsert=True
+        )
+
+    async def mark_synced_async(self, split: str, partitions: List[str]) -> None:
+        """mark_synced on the async client."""
+        database = self._get_async_db()
+        if database is None:
+            return await asyncio.to_thread(self.mark_synced, split, partitions)
+        await database[META_COLLECTION].update_one(
+            {"_id": SYNC_META_ID}, {"$addToSet": {split: {"$each": list(partitions)}}}, upsert=True
+        )
+
+    def change_token(self) -> Optional[tuple]:
+        """Cheap token that changes whenever the train/test collections change."""
+        if not self.is_connected():
+            return None
+        try:
+            meta = self.db[META_COLLECTION].find_one({"_id": "data_version"})
+            return (
+                meta["value"] if meta else 0,
+                self.db[TRAIN_COLLECTION].estimated_document_count(),
+                self.db[TEST_COLLECTION].estimated_document_count()
+            )
+        except PyMongoError:
+            return None
+
+def _upsert_batches(df: pd.DataFrame, batch_size: int):
+    """Yield lists of STUDENTID-keyed ReplaceOne upserts; the last row of a repeated student wins."""
+    records = df.drop_duplicates(subset=[KEY_COLUMN], keep="last").to_dict(orient="records")
+    for start in range(0, len(records), batch_size):
+        yield [
+            ReplaceOne({KEY_COLUMN: record[KEY_COLUMN]}, record, upsert=True)
+            for record in records[start:start + batch_size]
+        ]
+
+def _add_write_counts(counts: Dict[str, int], result) -> None:
+    counts["inserted"] += result.upserted_count
+    counts["updated"] += result.modified_count
+    counts["unchanged"] += result.matched_count - result.modified_count
+
+def _row_getter(columns):
+    """Return a function mapping a document to the tuple of its values for columns (None if missing)."""
+    if not columns:
+        return lambda doc: ()
+    getter = operator.itemgetter(*columns)
+
+    def get(doc):
+        try:
+            values = getter(doc)
+        except KeyError:
+            values = tuple(doc.get(col) for col in columns)
+        return values if len(columns) > 1 else (values,)
+    return get
+
+def _numeric_block(batch, get_values, columns) -> np.ndarray:
+    rows = [get_values(doc) for doc in batch]
+    try:
+        return np.array(rows, dtype=np.float64)
+    except (TypeError, ValueError):
+        # Non-numeric values (should not pass validation) become NaN
+        return pd.DataFrame(rows, columns=columns).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+
+def _grow(array, capacity):
+    grown = np.empty((capacity, array.shape[1]), dtype=array.dtype, order='F')
+    grown[:len(array)] = array
+    return grown
+
+# Singleton instance (connects in the background once first used)
 db = Database()
\ No newline at end of file
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import threading
+import time
+import pandas as pd
+from src.database import db, EXPECTED_COLUMNS
+from src.schema import SchemaError, get_schema
+from src.store import get_store, SPLITS
+
+# Minimum seconds between change-token checks against MongoDB / the columnar store
+TOKEN_CHECK_SECONDS = float(os.getenv("DATASET_TOKEN_CHECK_SECONDS", "2"))
+
+# Set once MongoDB holds every committed store partition; until then reads use the store,
+# so rows uploaded while MongoDB was unreachable are never hidden behind the collections
+mongo_synced = threading.Event()
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Return the frame with the expected column order, STUDENTID as string and numeric features/target."""
+    if df.empty:
+        return pd.DataFrame(columns=EXPECTED_COLUMNS)
+    if list(df.columns) != EXPECTED_COLUMNS:
+        # Keep unexpected layouts untouched so downstream validation can report them
+        return df
+    df = df.copy()
+    df['STUDENTID'] = df['STUDENTID'].astype(str)
+    numeric_columns = [col for col in EXPECTED_COLUMNS if col != 'STUDENTID']
+    df[numeric_columns] = df[numeric_columns].apply(pd.to_numeric, errors='coerce')
+    return df
+
+def load_data_source(store=None):
+    """Get train and test data from MongoDB if available (and in sync with the store), else from the columnar store.
+
+    The collections may hold documents written by other tools or before the schema existed,
+    so MongoDB frames are validated; if either is invalid the store is used instead.
+    """
+    if db.is_connected() and mongo_synced.is_set():
+        train_data = db.load_from_collection("train")
+        test_data = db.load_from_collection("test")
+        if train_data is not None and not train_data.empty and test_data is not None and not test_data.empty:
+            try:
+                schema = get_schema()
+                for split, frame in (("train", train_data), ("test", test_data)):
+                    schema.validate(frame, f"MongoDB '{split}' collection", row_name="document")
+                return normalize_frame(train_data), normalize_frame(test_data)
+            except SchemaError as e:
+                print(f"Reading from the dataset store instead: {e}")
+    # Fallback to the on-disk store (bootstrapped from the CSVs)
+    store = store or get_store()
+    return normalize_frame(store.read('train')), normalize_frame(store.read('test'))
+
+def _unsynced_partitions(store, split, synced, seed) -> list:
+    """Committed partitions of a split not yet written to MongoDB (all of them when seeding an empty collection).
+
+    Partitions of an upload still in progress have no live rows yet, so they are picked up
+    by a later sync once committed.
+    """
+    live = sorted(store.index.live_rows(split))
+    return live if seed else [partition for partition in live if partition not in synced]
+
+async def sync_database(store) -> dict:
+    """Write the store partitions MongoDB has not received yet as STUDENTID-keyed upserts.
+
+    MongoDB records which partitions it holds (see Database.synced_partitions), so an upload
+    made while it was unreachable is written by the next sync. A split whose collection is
+    empty is seeded from the whole store split. Returns the upsert counts per split (empty
+    while MongoDB is unreachable). MongoDB is written through the async client; store reads
+    run in a worker thread.
+    """
+    if not db.is_connected():
+        return {}
+    try:
+        synced = await db.synced_partitions_async()
+        report = {}
+        for split in SPLITS:
+            seed = await db.count_documents_async(split) == 0
+            pending = await asyncio.to_thread(_unsynced_partitions, store, split, synced.get(split, []), seed)
+            if not pending:
+                continue
+            rows = await asyncio.to_thread(store.read, split, None, pending)
+            if not rows.empty:
+                report[split] = await db.upsert_to_collection_async(normalize_frame(rows), split)
+            await db.mark_synced_async(split, pending)
+        if report:
+            await db.bump_data_version_async()
+    except Exception:
+        # MongoDB may now lack committed partitions: read from the store until a sync succeeds
+        mongo_synced.clear()
+        raise
+    mongo_synced.set()
+    return report
+
+def reconcile_database(store) -> dict:
+    """sync_database on the sync client; run in the connect thread as soon as MongoDB is reachable."""
+    synced = db.synced_partitions()
+    report = {}
+    for split in SPLITS:
+        pending = _unsynced_partitions(store, split, synced.get(split, []), db.count_documents(split) == 0)
+        if not pending:
+            continue
+        rows = store.read(split, None, pending)
+        if not rows.empty:
+            report[split] = db.upsert_to_collection(normalize_frame(rows), split)
+        db.mark_synced(split, pending)
+    if report:
+        db.bump_data_version()
+        print(f"Wrote store partitions missing from MongoDB: {report}")
+    mongo_synced.set()
+    return report
+
+class DatasetCache:
+    """Process-level cache of the train/test frames with a monotonically increasing data version.
+
+    The frames are reloaded only when invalidate() is called (after an upload commits) or when
+    the change token moves: the data version counter kept in MongoDB plus the collection sizes,
+    and the partitions of the columnar store. The token is checked at most every check_interval
+    seconds. Cached frames are shared between callers and must not be modified in place.
+    """
+
+    def __init__(self, store=None, check_interval=TOKEN_CHECK_SECONDS):
+        self._store = store
+        self.check_interval = check_interval
+        self._frames = None
+        self._token = None
+        self._checked_at = 0.0
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        """The columnar store backing the file fallback, opened on first use."""
+        if self._store is None:
+            self._store = get_store()
+        return self._store
+
+    def _change_token(self):
+        token = [self.store.change_token()]
+        if db.is_connected() and mongo_synced.is_set():
+            token.append(db.change_token())
+        return tuple(token)
+
+    def get(self):
+        """Return (train_data, test_data), reloading them if the data has changed."""
+        with self._lock:
+            now = time.monotonic()
+            if self._frames is not None and now - self._checked_at < self.check_interval:
+                return self._frames
+            token = self._change_token()
+            self._checked_at = now
+            if self._frames is None or token != self._token:
+                self._frames = load_data_source(self.store)
+                self._token = token
+                self._version += 1
+            return self._frames
+
+    def invalidate(self):
+        """Drop the cached frames so the next get() reloads them under a new version."""
+        with self._lock:
+            self._frames = None
+            self._token = None
+
+    @property
+    def version(self) -> int:
+        """Data version of the cached frames; increases every time they are reloaded."""
+        return self._version
+
+    def info(self) -> dict:
+        """Data version and row counts of the cached frames."""
+        with self._lock:
+            frames = self._frames
+            return {
+                'version': self._version,
+                'loaded': frames is not None,
+                'train_rows': len(frames[0]) if frames is not None else None,
+                'test_rows': len(frames[1]) if frames is not None else None
+            }
+
+# Singleton instance
+dataset_cache = DatasetCache()
+
+# Catch MongoDB up with the store whenever the connection comes up
+db.add_connect_callback(lambda: reconcile_database(dataset_cache.store))
@@ -0,0 +1,159 @@
+import os
+import shutil
+import threading
+import numpy as np
+
+# Published TFLite artifacts, one per quantization variant
+TFLITE_VARIANTS = ('float16', 'int8')
+EXPORT_DIR = 'models'
+
+# Largest allowed drop in test accuracy / weighted F1 versus the Keras model
+MAX_ACCURACY_DROP = float(os.getenv("TFLITE_MAX_ACCURACY_DROP", "0.01"))
+MAX_F1_DROP = float(os.getenv("TFLITE_MAX_F1_DROP", "0.01"))
+
+def tflite_path(variant, export_dir=EXPORT_DIR):
+    """Path of the published TFLite model for a quantization variant."""
+    return os.path.join(export_dir, f"model_{variant}.tflite")
+
+def convert_to_tflite(model, variant):
+    """Convert a Keras model to a TFLite flatbuffer (float16 or int8 dynamic-range weights)."""
+    import tensorflow as tf
+
+    if variant not in TFLITE_VARIANTS:
+        raise ValueError(f"Unknown TFLite variant '{variant}'. Use one of {TFLITE_VARIANTS}")
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    return converter.convert()
+
+class TFLiteModel:
+    """Serve a TFLite model: scale and clip raw features, then run the interpreter."""
+
+    def __init__(self, model_content, scaler):
+        import tensorflow as tf
+
+        self.interpreter = tf.lite.Interpreter(model_content=model_content)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+        self.scaler = scaler
+        self._batch_size = None
+        # A TFLite interpreter must not be invoked from several threads at once
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path, scaler):
+        with open(path, 'rb') as f:
+            return cls(f.read(), scaler)
+
+    def predict_scaled(self, X_scaled):
+        """Return class probabilities for an already scaled and clipped matrix."""
+        X_scaled = np.ascontiguousarray(X_scaled, dtype=np.float32)
+        with self._lock:
+            if self._batch_size != X_scaled.shape[0]:
+                self.interpreter.resize_tensor_input(self.input_index, list(X_scaled.shape))
+                self.interpreter.allocate_tensors()
+                self._batch_size = X_scaled.shape[0]
+            self.interpreter.set_tensor(self.input_index, X_scaled)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output_index).copy()
+
+    def predict(self, X):
+        """Return class probabilities for a raw (unscaled) feature matrix."""
+        X_scaled = np.clip(self.scaler.transform(np.asarray(X, dtype=np.float64).reshape(len(X), -1)), -5, 5)
+        return self.predict_scaled(X_scaled)
+
+def _classification_metrics(y_pred_probs, y_test):
+    """Accuracy and weighted F1, computed the same way as evaluate_model."""
+    from sklearn.metrics import f1_score
+
+    y_pred = np.argmax(y_pred_probs, axis=1)
+    y_true = np.argmax(y_test, axis=1)
+    return {
+        'accuracy': float(np.mean(y_pred == y_true)),
+        'f1_score': float(f1_score(y_true, y_pred, average='weighted'))
+    }
+
+def export_quantized_models(X_test, y_test, model_path='models/model.keras', export_dir=EXPORT_DIR,
+                            variants=TFLITE_VARIANTS, max_accuracy_drop=MAX_ACCURACY_DROP, max_f1_drop=MAX_F1_DROP):
+    """Export TFLite variants of the saved model, publishing only those that pass the accuracy gate.
+
+    X_test is the scaled and clipped test matrix and y_test its one-hot targets (as returned by
+    preprocess_test_data). A variant whose test accuracy or weighted F1 drops by more than the
+    allowed margin is not published, and any previously published file for it is removed so it
+    can never be served alongside a newer Keras model.
+    """
+    import tensorflow as tf
+
+    try:
+        model = tf.keras.models.load_model(model_path)
+        baseline = _classification_metrics(model.predict(X_test, verbose=0), y_test)
+        report = {'baseline': baseline, 'variants': {}}
+
+        os.makedirs(export_dir, exist_ok=True)
+        for variant in variants:
+            content = convert_to_tflite(model, variant)
+            metrics = _classification_metrics(TFLiteModel(content, scaler=None).predict_scaled(X_test), y_test)
+            accuracy_drop = baseline['accuracy'] - metrics['accuracy']
+            f1_drop = baseline['f1_score'] - metrics['f1_score']
+            published = accuracy_drop <= max_accuracy_drop and f1_drop <= max_f1_drop
+
+            path = tflite_path(variant, export_dir)
+            if published:
+                # Write next to the target and rename so readers never see a partial file
+                temp_path = f"{path}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(content)
+                os.replace(temp_path, path)
+            elif os.path.exists(path):
+                os.remove(path)
+            print(f"TFLite {variant}: accuracy {metrics['accuracy']:.4f} (drop {accuracy_drop:+.4f}), "
+                  f"F1 {metrics['f1_score']:.4f} (drop {f1_drop:+.4f}) -> {'published' if published else 'rejected'}")
+
+            report['variants'][variant] = {
+                **metrics,
+                'accuracy_drop': accuracy_drop,
+                'f1_drop': f1_drop,
+                'size_bytes': len(content),
+                'published': published,
+                'path': path if published else None
+            }
+        return report
+    except FileNotFoundError as e:
+        raise FileNotFoundError(f"Missing file: {e}")
+    except Exception as e:
+        raise Exception(f"Error exporting TFLite models: {e}")
+
+def publish_tflite_models(staging_dir, export_dir=EXPORT_DIR):
+    """Move the variants exported into staging_dir into export_dir; variants missing there are unpublished."""
+    for variant in TFLITE_VARIANTS:
+        staged_path = tflite_path(variant, staging_dir)
+        path = tflite_path(variant, export_dir)
+        if os.path.exists(staged_path):
+            os.replace(staged_path, path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+def backup_tflite_models(export_dir=EXPORT_DIR):
+    """Copy the published TFLite models aside before a retrain (mirrors model_backup.keras)."""
+    for variant in TFLITE_VARIANTS:
+        path = tflite_path(variant, export_dir)
+        backup_path = path.replace('.tflite', '_backup.tflite')
+        if os.path.exists(path):
+            shutil.copy(path, backup_path)
+        elif os.path.exists(backup_path):
+            os.remove(backup_path)
+
+def restore_tflite_models(restore, export_dir=EXPORT_DIR):
+    """Restore (restore=True) or discard (restore=False) the TFLite backups taken before a retrain."""
+    for variant in TFLITE_VARIANTS:
+        path = tflite_path(variant, export_dir)
+        backup_path = path.replace('.tflite', '_backup.tflite')
+        if restore:
+            if os.path.exists(backup_path):
+                shutil.move(backup_path, path)
+            elif os.path.exists(path):
+                os.remove(path)
+        elif os.path.exists(backup_path):
+            os.remove(backup_path)
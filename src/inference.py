@@ -0,0 +1,86 @@
+import numpy as np
+
+def _relu(x):
+    return np.maximum(x, 0, out=x)
+
+def _softmax(x):
+    x -= x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+ACTIVATIONS = {
+    'relu': _relu,
+    'softmax': _softmax,
+    'sigmoid': _sigmoid,
+    'tanh': np.tanh,
+    'linear': lambda x: x
+}
+
+# Layers that are identity functions at inference time
+PASSTHROUGH_LAYERS = ('InputLayer', 'Dropout')
+
+class NumpyDenseModel:
+    """Evaluate a Dense-only Keras network (as built by create_model) in NumPy.
+
+    The StandardScaler and the +/-5 clip applied before the network are folded into the
+    first stage: inputs are clipped to [mean - 5*scale, mean + 5*scale] in raw feature space,
+    which is equivalent to clipping the scaled values, and the scaling itself is absorbed
+    into the first layer's kernel and bias.
+    """
+
+    def __init__(self, kernels, biases, activations, lower, upper):
+        if not (len(kernels) == len(biases) == len(activations)):
+            raise ValueError("kernels, biases and activations must have the same length")
+        self.kernels = [np.ascontiguousarray(k, dtype=np.float32) for k in kernels]
+        self.biases = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+        for name in self.activations:
+            if name not in ACTIVATIONS:
+                raise ValueError(f"Unsupported activation '{name}'")
+        self.lower = np.ascontiguousarray(lower, dtype=np.float32)
+        self.upper = np.ascontiguousarray(upper, dtype=np.float32)
+        self.n_features = self.kernels[0].shape[0]
+
+    @classmethod
+    def from_keras(cls, model, scaler, clip_value=5.0):
+        """Extract the Dense weights of a Keras model and fold the fitted scaler into them."""
+        kernels, biases, activations = [], [], []
+        for layer in model.layers:
+            layer_type = type(layer).__name__
+            if layer_type in PASSTHROUGH_LAYERS:
+                continue
+            if layer_type != 'Dense':
+                raise ValueError(f"Layer '{layer.name}' of type {layer_type} is not supported by the NumPy backend")
+            kernel, bias = layer.get_weights()
+            kernels.append(kernel.astype(np.float64))
+            biases.append(bias.astype(np.float64))
+            activations.append(layer.activation.__name__)
+        if not kernels:
+            raise ValueError("Model has no Dense layers")
+
+        mean = np.asarray(scaler.mean_, dtype=np.float64)
+        scale = np.asarray(scaler.scale_, dtype=np.float64)
+        # ((x - mean) / scale) @ W + b  ==  x @ (W / scale) + (b - (mean / scale) @ W)
+        biases[0] = biases[0] - (mean / scale) @ kernels[0]
+        kernels[0] = kernels[0] / scale[:, None]
+        lower = mean - clip_value * scale
+        upper = mean + clip_value * scale
+        return cls(kernels, biases, activations, lower, upper)
+
+    def predict(self, X):
+        """Return class probabilities for a raw (unscaled) (n_rows, n_features) matrix."""
+        x = np.asarray(X, dtype=np.float32)
+        if x.ndim == 1:
+            x = x.reshape(1, -1)
+        if x.shape[1] != self.n_features:
+            raise ValueError(f"Input must have {self.n_features} features")
+        x = np.clip(x, self.lower, self.upper)
+        for kernel, bias, activation in zip(self.kernels, self.biases, self.activations):
+            x = x @ kernel
+            x += bias
+            x = ACTIVATIONS[activation](x)
+        return x
@@ -0,0 +1,380 @@
+import contextlib
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import fcntl
+except ImportError:  # Windows: jobs are then only coordinated within one API worker
+    fcntl = None
+
+# Job records shared by all API worker processes; the job process reports its progress there too
+JOB_STATE_PATH = os.getenv("RETRAIN_JOB_STATE", "models/retrain_jobs.json")
+# Number of finished jobs kept for status polling
+MAX_FINISHED_JOBS = 20
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Retrain modes: 'auto' fine-tunes the current model on the rows added since it was trained
+# (plus a replay sample of older rows) when it can, 'full' always retrains on the whole set
+RETRAIN_MODES = ('auto', 'full')
+# Incremental retraining is used while new rows are at most this fraction of the training set
+INCREMENTAL_MAX_NEW_FRACTION = float(os.getenv("INCREMENTAL_MAX_NEW_FRACTION", "0.5"))
+# Already-trained rows replayed per new row (at least INCREMENTAL_MIN_REPLAY_ROWS)
+INCREMENTAL_REPLAY_RATIO = float(os.getenv("INCREMENTAL_REPLAY_RATIO", "4"))
+INCREMENTAL_MIN_REPLAY_ROWS = int(os.getenv("INCREMENTAL_MIN_REPLAY_ROWS", "256"))
+INCREMENTAL_EPOCHS = int(os.getenv("INCREMENTAL_EPOCHS", "5"))
+INCREMENTAL_LEARNING_RATE = float(os.getenv("INCREMENTAL_LEARNING_RATE", "5e-4"))
+# A fine-tuned model is kept only if test accuracy and weighted F1 drop by at most this much;
+# otherwise the job falls back to a full retrain
+INCREMENTAL_TOLERANCE = float(os.getenv("INCREMENTAL_TOLERANCE", "0.01"))
+# Job-private directories where a retrain writes its scaler, modes, model and TFLite files before publishing them
+STAGING_DIR = os.getenv("RETRAIN_STAGING_DIR", "models/staging")
+
+class JobConflictError(Exception):
+    """Raised when a retrain is submitted while another one is queued or running."""
+
+    def __init__(self, job):
+        self.job = job
+        super().__init__(f"Retrain job {job['job_id']} is already {job['status']}")
+
+def _report(progress, job_id, **fields):
+    """Publish progress of a job to the API workers."""
+    progress.set_progress(job_id, {**fields, 'updated_at': time.time()})
+
+def _make_progress_callback(progress, job_id):
+    import tensorflow as tf
+
+    class ProgressCallback(tf.keras.callbacks.Callback):
+        """Report epoch progress and latest training metrics after every epoch."""
+
+        def on_epoch_end(self, epoch, logs=None):
+            _report(progress, job_id, phase='training', epoch=epoch + 1, epochs=self.params.get('epochs'),
+                    logs={key: float(value) for key, value in (logs or {}).items()})
+
+    return ProgressCallback()
+
+def _summary(metrics) -> dict:
+    """Metrics from evaluate_model without the per-row labels and predictions."""
+    return {key: value for key, value in metrics.items() if key not in ['y_true', 'y_pred']}
+
+def _regressed(old_metrics, new_metrics) -> bool:
+    """Whether test accuracy or weighted F1 dropped by more than INCREMENTAL_TOLERANCE."""
+    return any(new_metrics[key] < old_metrics[key] - INCREMENTAL_TOLERANCE for key in ('accuracy', 'f1_score'))
+
+def run_retrain_job(job_id, train_data, test_data, progress, mode='auto', model_path='models/model.keras',
+                    backup_path='models/model_backup.keras', manifest_path=None, scaler_path='models/scaler.pkl',
+                    modes_path='models/modes.pkl', staging_dir=None):
+    """Retrain (or train from scratch) on the given frames; runs inside a worker process.
+
+    In 'auto' mode a model with a training manifest is fine-tuned on only the rows added or
+    changed since (see retrain_and_save_model), unless they are too large a share of the data
+    or the fine-tuned model regresses on the test set, in which case it is fully retrained.
+    With no such rows the job returns before taking backups, leaving the model untouched.
+
+    The scaler, modes, model and TFLite files are written to a directory of the job under
+    staging_dir and only moved over the served ones once training and export are done, so
+    serving never pairs the old model with a new scaler.
+    """
+    from src.preprocessing import preprocess_train_data, preprocess_test_data, training_class_weight, backup_preprocessing
+    from src.model import train_and_save_model, retrain_and_save_model, evaluate_model
+    from src.export import export_quantized_models, backup_tflite_models, publish_tflite_models, tflite_path
+    from src.shared_weights import publish_weights
+    from src.manifest import MANIFEST_PATH, TrainingManifest, split_new_rows, backup_manifest
+    import numpy as np
+
+    manifest_path = manifest_path or MANIFEST_PATH
+    stage = os.path.join(staging_dir or STAGING_DIR, job_id)
+    staged_model = os.path.join(stage, os.path.basename(model_path))
+    staged_scaler = os.path.join(stage, os.path.basename(scaler_path))
+    staged_modes = os.path.join(stage, os.path.basename(modes_path))
+    _report(progress, job_id, phase='preparing')
+    old_metrics = None
+    manifest = TrainingManifest.load(manifest_path) if os.path.exists(model_path) else None
+    new_rows = None
+    if mode != 'full' and manifest is not None:
+        new_rows, trained_rows = split_new_rows(train_data, manifest)
+    if os.path.exists(model_path):
+        _report(progress, job_id, phase='evaluating_old_model')
+        X_test_scaled_old, y_test_onehot_old = preprocess_test_data(test_data, scaler_path, modes_path)
+        old_metrics = _summary(evaluate_model(X_test_scaled_old, y_test_onehot_old, model_path=model_path))
+        if new_rows is not None and new_rows.empty:
+            return {
+                "message": "No training rows were added or changed since the current model was trained; model unchanged",
+                "mode": "none",
+                "new_rows": 0,
+                "old_metrics": old_metrics,
+                "new_metrics": old_metrics,
+                "tflite_export": None
+            }
+        shutil.copy(model_path, backup_path)
+        backup_tflite_models()
+        backup_preprocessing(scaler_path, modes_path)
+        backup_manifest(manifest_path)
+
+    try:
+        os.makedirs(stage, exist_ok=True)
+        callbacks = [_make_progress_callback(progress, job_id)]
+        version = manifest.version + 1 if manifest is not None else 1
+        new_manifest = None
+        new_metrics = None
+        reason = None
+        if mode == 'full':
+            reason = "full retrain requested"
+        elif manifest is None:
+            reason = "no training manifest for the current model"
+        elif len(new_rows) > INCREMENTAL_MAX_NEW_FRACTION * (len(new_rows) + len(trained_rows)):
+            reason = f"{len(new_rows)} new rows exceed {INCREMENTAL_MAX_NEW_FRACTION:.0%} of the training set"
+        else:
+            # Fine-tune a copy of the model with its own scaler and modes on the new rows plus replayed old rows
+            _report(progress, job_id, phase='preprocessing', mode='incremental', new_rows=len(new_rows))
+            X_new, y_new = preprocess_test_data(new_rows, scaler_path, modes_path)
+            X_old, y_old = preprocess_test_data(trained_rows, scaler_path, modes_path)
+            replay_rows = min(len(X_old), max(INCREMENTAL_MIN_REPLAY_ROWS, int(INCREMENTAL_REPLAY_RATIO * len(X_new))))
+            shutil.copy(model_path, staged_model)
+            _, history = retrain_and_save_model(X_new, y_new, model_path=staged_model, epochs=INCREMENTAL_EPOCHS, callbacks=callbacks,
+                                                class_weight=training_class_weight(np.concatenate([y_new, y_old]), 'class_weight'),
+                                                X_replay=X_old, y_replay=y_old, replay_rows=replay_rows,
+                                                learning_rate=INCREMENTAL_LEARNING_RATE)
+            _report(progress, job_id, phase='evaluating_new_model')
+            X_test_scaled_new, y_test_onehot_new = X_test_scaled_old, y_test_onehot_old
+            new_metrics = _summary(evaluate_model(X_test_scaled_new, y_test_onehot_new, model_path=staged_model))
+            if _regressed(old_metrics, new_metrics):
+                reason = "incremental model regressed on the test set"
+                new_metrics = None
+            else:
+                shutil.copy(scaler_path, staged_scaler)
+                shutil.copy(modes_path, staged_modes)
+                new_manifest = manifest.extended(new_rows, 'incremental')
+
+        if new_metrics is None:
+            _report(progress, job_id, phase='preprocessing', mode='full')
+            X_train_scaled, y_train_onehot, X_val_scaled, y_val_onehot = preprocess_train_data(
+                train_data, scaler_path=staged_scaler, modes_path=staged_modes, save_dir=stage)
+
+            class_weight = training_class_weight(y_train_onehot)
+            if os.path.exists(model_path):
+                shutil.copy(model_path, staged_model)
+                _, history = retrain_and_save_model(X_train_scaled, y_train_onehot, model_path=staged_model, X_val=X_val_scaled,
+                                                    y_val=y_val_onehot, callbacks=callbacks, class_weight=class_weight)
+            else:
+                _, history = train_and_save_model(X_train_scaled, y_train_onehot, model_save_path=staged_model, X_val=X_val_scaled,
+                                                  y_val=y_val_onehot, callbacks=callbacks, class_weight=class_weight)
+
+            _report(progress, job_id, phase='evaluating_new_model')
+            X_test_scaled_new, y_test_onehot_new = preprocess_test_data(test_data, staged_scaler, staged_modes)
+            new_metrics = _summary(evaluate_model(X_test_scaled_new, y_test_onehot_new, model_path=staged_model))
+            new_manifest = TrainingManifest.from_frame(train_data[train_data['GRADE'].notnull()], version, 'full')
+
+        # Export quantized TFLite models; a failed export must not fail the retrain
+        _report(progress, job_id, phase='exporting')
+        try:
+            export_report = export_quantized_models(X_test_scaled_new, y_test_onehot_new, model_path=staged_model,
+                                                    export_dir=stage)
+        except Exception as e:
+            export_report = {"error": str(e)}
+
+        # Publish the new files together, the Keras model last since serving reloads on its change
+        _report(progress, job_id, phase='publishing')
+        publish_tflite_models(stage)
+        for name, variant in export_report.get('variants', {}).items():
+            if variant['published']:
+                variant['path'] = tflite_path(name)
+        os.replace(staged_scaler, scaler_path)
+        os.replace(staged_modes, modes_path)
+        os.replace(staged_model, model_path)
+    finally:
+        shutil.rmtree(stage, ignore_errors=True)
+
+    # Record the rows this model version was trained on
+    new_manifest.version = version
+    new_manifest.save(manifest_path)
+
+    # Publish memory-mappable weights so serving workers never have to load TensorFlow
+    try:
+        publish_weights(model_path, scaler_path)
+    except Exception as e:
+        print(f"Publishing shared weights failed: {e}")
+
+    return {
+        "message": "Model retrained successfully",
+        "mode": new_manifest.mode,
+        "reason": reason,
+        "new_rows": len(new_rows) if new_rows is not None else None,
+        "model_version": version,
+        "training": {key: history.get(key) for key in ('stop_reason', 'epochs_run', 'resumed_from_epoch', 'best_epoch')},
+        "old_metrics": old_metrics,
+        "new_metrics": new_metrics,
+        "tflite_export": export_report
+    }
+
+def _to_json(value):
+    # NumPy scalars and arrays in job results
+    return value.tolist() if hasattr(value, 'tolist') else str(value)
+
+class JobStateFile:
+    """Retrain job records in a JSON file, so every API worker process sees the same jobs.
+
+    Updates read, modify and rewrite the file under an exclusive lock on <path>.lock; the
+    file is replaced atomically, so reads need no lock.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or JOB_STATE_PATH
+
+    def read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @contextlib.contextmanager
+    def update(self):
+        """Yield the job records for changing; they are written back unless the block raises."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(f"{self.path}.lock", 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            jobs = self.read()
+            yield jobs
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(jobs, f, default=_to_json)
+            os.replace(temp_path, self.path)
+
+    def set_progress(self, job_id, fields):
+        with self.update() as jobs:
+            if job_id in jobs:
+                jobs[job_id]['progress'] = {**(jobs[job_id].get('progress') or {}), **fields}
+
+class RetrainJobManager:
+    """Run retraining in a separate worker process and track job status and progress.
+
+    Only one retrain may be queued or running at a time across all API workers; a second
+    submission raises JobConflictError carrying the active job. Job records live in a
+    JobStateFile, and the worker running a job holds a lock on <state path>.running until it
+    finishes, which the OS releases if that worker dies. The job process is spawned on first
+    use so the API process never forks a TensorFlow runtime.
+    """
+
+    def __init__(self, on_complete=None, state_path=None):
+        self.on_complete = on_complete
+        self.state = JobStateFile(state_path)
+        self._executor = None
+        self._running = None
+        self._lock = threading.Lock()
+
+    def _ensure_pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+
+    def _acquire_running(self) -> bool:
+        """Take the lock held while this worker runs a job; False if another worker holds it."""
+        lock = open(f"{self.state.path}.running", 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                return False
+        self._running = lock
+        return True
+
+    def _release_running(self):
+        if self._running is not None:
+            self._running.close()
+            self._running = None
+
+    def _reap(self, jobs):
+        """Fail jobs left active by a worker that exited; call with the running lock held by this worker."""
+        for job in jobs.values():
+            if job['status'] in ACTIVE_STATUSES:
+                job.update(status='failed', error="The API worker running this job exited", finished_at=time.time())
+
+    def submit(self, train_data, test_data, mode='auto') -> dict:
+        """Queue a retrain on the given frames and return the new job's status."""
+        if mode not in RETRAIN_MODES:
+            raise ValueError(f"Unknown retrain mode '{mode}'; expected one of {', '.join(RETRAIN_MODES)}")
+        with self._lock, self.state.update() as jobs:
+            if self._running is not None or not self._acquire_running():
+                active = [job for job in jobs.values() if job['status'] in ACTIVE_STATUSES]
+                raise JobConflictError(self._snapshot(active[-1]) if active else {'job_id': 'unknown', 'status': 'running'})
+            self._reap(jobs)
+            try:
+                self._ensure_pool()
+                job_id = uuid.uuid4().hex[:12]
+                job = {
+                    'job_id': job_id,
+                    'status': 'queued',
+                    'submitted_at': time.time(),
+                    'finished_at': None,
+                    'result': None,
+                    'error': None
+                }
+                jobs[job_id] = job
+                self._prune(jobs)
+                future = self._executor.submit(run_retrain_job, job_id, train_data, test_data, self.state, mode)
+            except Exception:
+                self._release_running()
+                raise
+            future.add_done_callback(lambda f: self._finish(job_id, f))
+            return self._snapshot(job)
+
+    def _finish(self, job_id, future):
+        with self._lock, self.state.update() as jobs:
+            job = jobs.setdefault(job_id, {'job_id': job_id})
+            try:
+                job['result'] = future.result()
+                job['status'] = 'succeeded'
+            except Exception as e:
+                job['error'] = str(e)
+                job['status'] = 'failed'
+                if isinstance(e, BrokenProcessPool):
+                    # The worker died (e.g. out of memory); start a fresh pool for the next job
+                    self._executor = None
+            job['finished_at'] = time.time()
+            # Released while the state lock is held, so other workers see the job finished first
+            self._release_running()
+            succeeded = job['status'] == 'succeeded'
+        if self.on_complete is not None and succeeded:
+            self.on_complete()
+
+    def _prune(self, jobs):
+        finished = [job_id for job_id, job in jobs.items() if job['status'] not in ACTIVE_STATUSES]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del jobs[job_id]
+
+    def _snapshot(self, job) -> dict:
+        snapshot = dict(job)
+        if snapshot.get('progress') and job['status'] == 'queued':
+            snapshot['status'] = 'running'
+        return snapshot
+
+    def get(self, job_id) -> dict:
+        """Return the status of a job, or None if it is unknown."""
+        job = self.state.read().get(job_id)
+        if job is not None and job['status'] in ACTIVE_STATUSES:
+            with self._lock:
+                # Nobody holds the running lock any more: the worker of this job exited
+                if self._running is None and self._acquire_running():
+                    try:
+                        with self.state.update() as jobs:
+                            self._reap(jobs)
+                            job = jobs.get(job_id)
+                    finally:
+                        self._release_running()
+        if job is None:
+            return None
+        return self._snapshot(job)
+
+    def shutdown(self):
+        """Stop the worker pool (running jobs are allowed to finish)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,81 @@
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from src.schema import KEY_COLUMN, TARGET_COLUMN
+
+MANIFEST_PATH = 'models/training_manifest.npz'
+
+def row_keys(df: pd.DataFrame) -> np.ndarray:
+    """64-bit hash of every row's student ID and values (insensitive to int/float dtypes of the same values)."""
+    values = df.drop(columns=[KEY_COLUMN]).apply(pd.to_numeric, errors='coerce').astype('float64')
+    values.insert(0, KEY_COLUMN, df[KEY_COLUMN].astype(str).to_numpy())
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+class TrainingManifest:
+    """The rows a model version was trained on, kept as a sorted array of row keys.
+
+    A row counts as trained only with the exact values the model saw: a student whose
+    values changed since is new again. Saved next to the model as a small .npz file.
+    """
+
+    def __init__(self, keys=None, version=0, mode=None, trained_at=None):
+        self.keys = np.unique(np.asarray(keys if keys is not None else [], dtype=np.uint64))
+        self.version = version
+        self.mode = mode
+        self.trained_at = trained_at
+
+    @classmethod
+    def load(cls, path=MANIFEST_PATH):
+        """Load the manifest, or return None if the model has none (e.g. it predates manifests)."""
+        try:
+            with np.load(path) as data:
+                return cls(data['keys'], int(data['version']), str(data['mode']), float(data['trained_at']))
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def save(self, path=MANIFEST_PATH):
+        """Write the manifest atomically."""
+        temp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(temp_path, keys=self.keys, version=self.version, mode=self.mode or '', trained_at=self.trained_at or time.time())
+        os.replace(temp_path, path)
+
+    def is_trained(self, df: pd.DataFrame) -> np.ndarray:
+        """Boolean mask of the rows the model was already trained on."""
+        return np.isin(row_keys(df), self.keys, assume_unique=False)
+
+    def extended(self, df: pd.DataFrame, mode: str) -> 'TrainingManifest':
+        """Manifest of the next model version: these rows plus the ones trained before."""
+        return TrainingManifest(np.concatenate([self.keys, row_keys(df)]), self.version + 1, mode, time.time())
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, version: int, mode: str = 'full') -> 'TrainingManifest':
+        """Manifest of a model trained on exactly these rows."""
+        return cls(row_keys(df), version, mode, time.time())
+
+def split_new_rows(train_data: pd.DataFrame, manifest: TrainingManifest):
+    """Split the training rows (with a target) into (new, already trained) frames."""
+    train_data = train_data[train_data[TARGET_COLUMN].notnull()]
+    trained = manifest.is_trained(train_data)
+    return train_data[~trained], train_data[trained]
+
+def backup_manifest(path=MANIFEST_PATH):
+    """Copy the manifest aside before a retrain (mirrors model_backup.keras)."""
+    backup_path = path.replace('.npz', '_backup.npz')
+    if os.path.exists(path):
+        shutil.copy(path, backup_path)
+    elif os.path.exists(backup_path):
+        os.remove(backup_path)
+
+def restore_manifest(restore, path=MANIFEST_PATH):
+    """Restore (restore=True) or discard (restore=False) the manifest backup taken before a retrain."""
+    backup_path = path.replace('.npz', '_backup.npz')
+    if restore:
+        if os.path.exists(backup_path):
+            shutil.move(backup_path, path)
+        elif os.path.exists(path):
+            # The previous model had no manifest
+            os.remove(path)
+    elif os.path.exists(backup_path):
+        os.remove(backup_path)
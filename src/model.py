@@ -1,49 +1,227 @@
+import hashlib
+import json
+import os
+import shutil
+import time
 import tensorflow as tf
-from tensorflow.keras.callbacks import EarlyStopping
+from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau, BackupAndRestore
 from sklearn.metrics import f1_score, classification_report
 import numpy as np
 import joblib
 
-def create_model(input_shape, num_classes):
-    """Create a neural network model for student grade classification."""
-    model = tf.keras.models.Sequential([
-        tf.keras.layers.Input(shape=(input_shape,)),
-        tf.keras.layers.Dense(units=16, activation='relu'),
-        tf.keras.layers.Dense(units=32, activation='relu'),
-        tf.keras.layers.Dense(units=num_classes, activation='softmax')
-    ])
+# Rows held by the shuffle buffer of the training input pipeline (a full shuffle for datasets up to this size)
+SHUFFLE_BUFFER_ROWS = int(os.getenv("TRAIN_SHUFFLE_BUFFER_ROWS", "200000"))
 
-    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=1e-3),
+# Training controller (train_and_save_model / retrain_and_save_model)
+# Wall-clock budget of one fit in seconds; 0 means no budget
+TRAIN_TIME_BUDGET_SECONDS = float(os.getenv("TRAIN_TIME_BUDGET_SECONDS", "0"))
+# Epochs without improvement of the (validation) loss before stopping with the best weights; 0 disables
+EARLY_STOPPING_PATIENCE = int(os.getenv("EARLY_STOPPING_PATIENCE", "10"))
+# Epochs without improvement before the learning rate is multiplied by LR_PLATEAU_FACTOR; 0 disables
+LR_PLATEAU_PATIENCE = int(os.getenv("LR_PLATEAU_PATIENCE", "5"))
+LR_PLATEAU_FACTOR = float(os.getenv("LR_PLATEAU_FACTOR", "0.5"))
+MIN_LEARNING_RATE = float(os.getenv("MIN_LEARNING_RATE", "1e-5"))
+# Per-epoch checkpoints of unfinished fits, so an interrupted train/retrain resumes from its last epoch; empty disables
+CHECKPOINT_DIR = os.getenv("TRAIN_CHECKPOINT_DIR", "models/checkpoints")
+# Written next to a checkpoint: digest of the fit it belongs to
+FINGERPRINT_FILE = 'fingerprint.txt'
+
+class TimeBudget(tf.keras.callbacks.Callback):
+    """Stop training once the next epoch would end past a wall-clock budget (in seconds)."""
+
+    def __init__(self, seconds):
+        super().__init__()
+        self.seconds = seconds
+        self.stopped_epoch = 0
+
+    def on_train_begin(self, logs=None):
+        self.started = time.monotonic()
+        self.epochs_seen = 0
+        self.stopped_epoch = 0
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.epochs_seen += 1
+        elapsed = time.monotonic() - self.started
+        if elapsed + elapsed / self.epochs_seen > self.seconds:
+            self.stopped_epoch = epoch + 1
+            self.model.stop_training = True
+
+class ResumableCheckpoint(BackupAndRestore):
+    """BackupAndRestore that resumes only a checkpoint of the same fit.
+
+    The fit's fingerprint (see _fit_fingerprint) is stored next to the checkpoint. A
+    checkpoint left by a different fit (other data, architecture, settings or starting
+    model), or one that cannot be restored, is discarded and the fit starts from epoch 0.
+    """
+
+    def __init__(self, backup_dir, fingerprint):
+        super().__init__(backup_dir=backup_dir)
+        self.fingerprint = fingerprint
+
+    def on_train_begin(self, logs=None):
+        fingerprint_path = os.path.join(self.backup_dir, FINGERPRINT_FILE)
+        if os.path.isdir(self.backup_dir):
+            try:
+                with open(fingerprint_path, 'r') as f:
+                    stored = f.read()
+            except OSError:
+                stored = None
+            if stored != self.fingerprint:
+                print(f"Discarding checkpoint in {self.backup_dir} left by a different fit")
+                shutil.rmtree(self.backup_dir, ignore_errors=True)
+        weights = self.model.get_weights()
+        try:
+            super().on_train_begin(logs)
+        except Exception as e:
+            print(f"Discarding checkpoint in {self.backup_dir} that could not be restored: {e}")
+            shutil.rmtree(self.backup_dir, ignore_errors=True)
+            # Undo a partial restore
+            self.model.set_weights(weights)
+        os.makedirs(self.backup_dir, exist_ok=True)
+        with open(fingerprint_path, 'w') as f:
+            f.write(self.fingerprint)
+
+def create_model(input_shape, num_classes, units=(16, 32), learning_rate=1e-3):
+    """Create a neural network model for student grade classification.
+
+    units gives the width of each hidden Dense layer (src/tuning.py searches over it).
+    """
+    model = tf.keras.models.Sequential(
+        [tf.keras.layers.Input(shape=(input_shape,))]
+        + [tf.keras.layers.Dense(units=width, activation='relu') for width in units]
+        + [tf.keras.layers.Dense(units=num_classes, activation='softmax')]
+    )
+
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate),
                   loss=tf.keras.losses.CategoricalCrossentropy(),
                   metrics=[tf.keras.metrics.CategoricalAccuracy(name="accuracy"),
                            tf.keras.metrics.Precision(name='precision'),
                            tf.keras.metrics.Recall(name='recall')])
     return model
 
-def train_and_save_model(X_train, y_train, model_save_path='models/model.keras', epochs=100, batch_size=32, X_val=None, y_val=None):
-    """Train a new model from scratch and save it, optionally using a validation set."""
+def make_dataset(X, y, batch_size=32, shuffle=False, seed=None):
+    """Build a tf.data input pipeline over the arrays, converted once to float32.
+
+    The converted tensors are cached, shuffled every epoch (if shuffle), batched and
+    prefetched so the next batch is prepared while the current one trains.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    dataset = tf.data.Dataset.from_tensor_slices((X, y)).cache()
+    if shuffle:
+        dataset = dataset.shuffle(min(len(X), SHUFFLE_BUFFER_ROWS), seed=seed, reshuffle_each_iteration=True)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+def _fit(model, X_train, y_train, epochs, batch_size, X_val=None, y_val=None, callbacks=None, class_weight=None, verbose=1):
+    """Fit the model on tf.data pipelines built once for the training (shuffled) and validation sets."""
+    train_dataset = make_dataset(X_train, y_train, batch_size, shuffle=True)
+    validation_data = make_dataset(X_val, y_val, batch_size) if X_val is not None and y_val is not None else None
+    return model.fit(train_dataset, epochs=epochs, validation_data=validation_data, callbacks=callbacks,
+                     class_weight=class_weight, verbose=verbose)
+
+def _checkpoint_dir(model_path, kind):
+    if not CHECKPOINT_DIR:
+        return None
+    return os.path.join(CHECKPOINT_DIR, f"{os.path.splitext(os.path.basename(model_path))[0]}-{kind}")
+
+def _fit_fingerprint(model, arrays, epochs, batch_size, class_weight=None, start_model_path=None) -> str:
+    """Digest of a fit: its arrays, architecture, optimizer config, fit settings and starting model file."""
+    digest = hashlib.sha256()
+    for array in arrays:
+        if array is not None:
+            array = np.ascontiguousarray(array, dtype=np.float32)
+            digest.update(str(array.shape).encode())
+            digest.update(array.tobytes())
+    digest.update(model.to_json().encode())
+    digest.update(json.dumps(model.optimizer.get_config(), sort_keys=True, default=str).encode())
+    digest.update(json.dumps([epochs, batch_size, sorted((class_weight or {}).items())], default=str).encode())
+    if start_model_path:
+        with open(start_model_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def _controlled_fit(model, X_train, y_train, epochs, batch_size, X_val=None, y_val=None, callbacks=None, class_weight=None,
+                    checkpoint_dir=None, time_budget=None, start_model_path=None):
+    """Fit under the training controller and return the history dict with stop_reason and epochs_run.
+
+    The controller adds early stopping (restoring the best weights), learning-rate reduction
+    on plateau, an optional wall-clock budget and per-epoch checkpoints in checkpoint_dir:
+    a fit that is interrupted resumes from its last finished epoch when the same fit (same
+    arrays, model, settings and start_model_path contents) is run again with the same
+    checkpoint_dir. The checkpoint is deleted once the fit finishes.
+    """
+    monitor = 'val_loss' if X_val is not None and y_val is not None else 'loss'
+    time_budget = TRAIN_TIME_BUDGET_SECONDS if time_budget is None else time_budget
+    budget = TimeBudget(time_budget) if time_budget > 0 else None
+    early_stopping = EarlyStopping(monitor=monitor, patience=EARLY_STOPPING_PATIENCE, restore_best_weights=True) \
+        if EARLY_STOPPING_PATIENCE > 0 else None
+    controller = [
+        ResumableCheckpoint(checkpoint_dir, _fit_fingerprint(model, (X_train, y_train, X_val, y_val), epochs, batch_size,
+                                                             class_weight, start_model_path))
+        if checkpoint_dir else None,
+        early_stopping,
+        ReduceLROnPlateau(monitor=monitor, factor=LR_PLATEAU_FACTOR, patience=LR_PLATEAU_PATIENCE, min_lr=MIN_LEARNING_RATE)
+        if LR_PLATEAU_PATIENCE > 0 else None,
+        budget
+    ]
+    history = _fit(model, X_train, y_train, epochs, batch_size, X_val, y_val,
+                   [callback for callback in controller if callback is not None] + list(callbacks or []), class_weight)
+
+    if budget is not None and budget.stopped_epoch:
+        stop_reason = 'time_budget'
+    elif early_stopping is not None and early_stopping.stopped_epoch:
+        stop_reason = 'early_stopping'
+    elif model.stop_training:
+        stop_reason = 'stopped_by_callback'
+    else:
+        stop_reason = 'completed'
+    result = dict(history.history)
+    result['stop_reason'] = stop_reason
+    result['epochs_run'] = history.epoch[-1] + 1 if history.epoch else epochs
+    result['resumed_from_epoch'] = history.epoch[0] if history.epoch and history.epoch[0] > 0 else None
+    if early_stopping is not None and early_stopping.best_weights is not None:
+        result['best_epoch'] = early_stopping.best_epoch + 1
+    print(f"Training stopped: {stop_reason} after {result['epochs_run']} of {epochs} epochs")
+    return result
+
+def train_and_save_model(X_train, y_train, model_save_path='models/model.keras', epochs=100, batch_size=32, X_val=None, y_val=None, callbacks=None,
+                         class_weight=None, units=(16, 32), learning_rate=1e-3, checkpoint_dir=None, time_budget=None):
+    """Train a new model from scratch and save it, optionally using a validation set and class weights.
+
+    Training runs under the controller of _controlled_fit; checkpoint_dir defaults to a
+    directory per model under CHECKPOINT_DIR ('' disables checkpoints).
+    """
     try:
         input_shape = X_train.shape[1]
         num_classes = y_train.shape[1]
-        model = create_model(input_shape, num_classes)
+        model = create_model(input_shape, num_classes, units, learning_rate)
         
         if X_val is not None and y_val is not None:
             if X_val.shape[1] != input_shape:
                 raise ValueError(f"Validation input shape {X_val.shape[1]} does not match training input shape {input_shape}")
             if y_val.shape[1] != num_classes:
                 raise ValueError(f"Validation output shape {y_val.shape[1]} does not match model output shape {num_classes}")
-            history = model.fit(X_train, y_train, epochs=epochs, batch_size=batch_size,
-                                validation_data=(X_val, y_val), verbose=1)
-        else:
-            history = model.fit(X_train, y_train, epochs=epochs, batch_size=batch_size, verbose=1)
+        if checkpoint_dir is None:
+            checkpoint_dir = _checkpoint_dir(model_save_path, 'train')
+        history = _controlled_fit(model, X_train, y_train, epochs, batch_size, X_val, y_val, callbacks, class_weight,
+                                  checkpoint_dir, time_budget)
         
         model.save(model_save_path)
-        return model, history.history
+        return model, history
     except Exception as e:
         raise Exception(f"Error during training: {e}")
 
-def retrain_and_save_model(X_train, y_train, model_path='models/model.keras', epochs=5, batch_size=32, X_val=None, y_val=None):
-    """Retrain an existing model with new data (transfer learning) and save it."""
+def retrain_and_save_model(X_train, y_train, model_path='models/model.keras', epochs=5, batch_size=32, X_val=None, y_val=None, callbacks=None,
+                           class_weight=None, X_replay=None, y_replay=None, replay_rows=0, learning_rate=None, seed=42,
+                           checkpoint_dir=None, time_budget=None):
+    """Retrain an existing model with new data (transfer learning) and save it.
+
+    Incremental mode: given X_replay/y_replay (rows the model was trained on before), a random
+    sample of up to replay_rows of them is mixed into the training rows, so fine-tuning on a
+    few new rows does not make the model forget the others. learning_rate overrides the
+    learning rate of the saved optimizer. Training runs under the controller of _controlled_fit.
+    """
     try:
         model = tf.keras.models.load_model(model_path)
         if X_train.shape[1] != model.input_shape[1]:
@@ -56,13 +234,19 @@ def retrain_and_save_model(X_train, y_train, model_path='models/model.keras', ep
                 raise ValueError(f"Validation input shape {X_val.shape[1]} does not match model input shape {model.input_shape[1]}")
             if y_val.shape[1] != model.output_shape[1]:
                 raise ValueError(f"Validation output shape {y_val.shape[1]} does not match model output shape {model.output_shape[1]}")
-            history = model.fit(X_train, y_train, epochs=epochs, batch_size=batch_size,
-                                validation_data=(X_val, y_val), verbose=1)
-        else:
-            history = model.fit(X_train, y_train, epochs=epochs, batch_size=batch_size, verbose=1)
+        if X_replay is not None and y_replay is not None and replay_rows > 0:
+            picked = np.random.default_rng(seed).choice(len(X_replay), size=min(replay_rows, len(X_replay)), replace=False)
+            X_train = np.concatenate([X_train, X_replay[picked]])
+            y_train = np.concatenate([y_train, y_replay[picked]])
+        if learning_rate is not None:
+            model.optimizer.learning_rate.assign(learning_rate)
+        if checkpoint_dir is None:
+            checkpoint_dir = _checkpoint_dir(model_path, 'incremental' if X_replay is not None else 'retrain')
+        history = _controlled_fit(model, X_train, y_train, epochs, batch_size, X_val, y_val, callbacks, class_weight,
+                                  checkpoint_dir, time_budget, start_model_path=model_path)
         
         model.save(model_path)
-        return model, history.history
+        return model, history
     except FileNotFoundError:
         raise FileNotFoundError(f"Model file {model_path} not found")
     except Exception as e:
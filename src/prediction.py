@@ -1,30 +1,65 @@
-import tensorflow as tf
-import joblib
 import numpy as np
+from src.registry import get_registry
 
 def load_and_predict(new_data, model_path='models/model.keras', scaler_path='models/scaler.pkl', mapping_path='models/categorical_mapping.pkl'):
-    """Load model and predict the grade label."""
+    """Predict the grade label using the in-process model registry."""
     try:
-        with open(scaler_path, 'rb') as f:
-            scaler = joblib.load(f)
-        model = tf.keras.models.load_model(model_path)
-        with open(mapping_path, 'rb') as f:
-            categorical_mapping = joblib.load(f)
-        grade_mapping = categorical_mapping['GRADE']
-        
+        artifacts = get_registry(model_path, scaler_path, mapping_path).get()
+
         new_data = np.array(new_data).reshape(1, -1)
         if new_data.shape[1] != 30:
             raise ValueError("Input must have 30 features")
-        new_data_scaled = scaler.transform(new_data)
-        new_data_scaled = np.clip(new_data_scaled, -5, 5)
-        
-        predictions = model.predict(new_data_scaled, verbose=0)
+
+        predictions = artifacts.predict_proba(new_data)
         predicted_class = np.argmax(predictions, axis=1)[0]
-        predicted_grade = grade_mapping[predicted_class]
+        predicted_grade = artifacts.grade_mapping[predicted_class]
         return predicted_grade
     except FileNotFoundError as e:
         raise FileNotFoundError(f"Missing file: {e}")
     except ValueError as e:
         raise ValueError(f"Prediction error: {e}")
     except Exception as e:
-        raise Exception(f"Unexpected error: {e}")
\ No newline at end of file
+        raise Exception(f"Unexpected error: {e}")
+
+def validate_feature_row(row):
+    """Convert one feature row to a float array, raising ValueError if it is not 30 finite numbers."""
+    if isinstance(row, (str, bytes)):
+        raise ValueError("Row must be a list of 30 numeric features")
+    try:
+        values = np.asarray(row, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError("Row must contain only numeric features")
+    if values.ndim != 1 or values.shape[0] != 30:
+        raise ValueError("Input must have 30 features")
+    if not np.all(np.isfinite(values)):
+        raise ValueError("Features must be finite numbers")
+    return values
+
+def predict_batch(rows, model_path='models/model.keras', scaler_path='models/scaler.pkl', mapping_path='models/categorical_mapping.pkl'):
+    """Predict grade labels for many rows with one scale/clip/predict pass.
+
+    Returns one result per input row, in order: {"row": i, "prediction": grade} for valid rows
+    and {"row": i, "error": message} for rows that failed validation.
+    """
+    try:
+        results = [None] * len(rows)
+        valid_idx = []
+        valid_rows = []
+        for i, row in enumerate(rows):
+            try:
+                valid_rows.append(validate_feature_row(row))
+                valid_idx.append(i)
+            except ValueError as e:
+                results[i] = {"row": i, "error": str(e)}
+
+        if valid_rows:
+            artifacts = get_registry(model_path, scaler_path, mapping_path).get()
+            predictions = artifacts.predict_proba(np.vstack(valid_rows))
+            predicted_classes = np.argmax(predictions, axis=1)
+            for i, predicted_class in zip(valid_idx, predicted_classes):
+                results[i] = {"row": i, "prediction": artifacts.grade_mapping[int(predicted_class)]}
+        return results
+    except FileNotFoundError as e:
+        raise FileNotFoundError(f"Missing file: {e}")
+    except Exception as e:
+        raise Exception(f"Unexpected error: {e}")
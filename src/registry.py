@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+import joblib
+import numpy as np
+
+# Default artifact locations
+MODEL_PATH = 'models/model.keras'
+SCALER_PATH = 'models/scaler.pkl'
+MAPPING_PATH = 'models/categorical_mapping.pkl'
+NUM_FEATURES = 30
+
+# Serving backend: 'keras' runs model.predict, 'numpy' runs the folded NumPy forward pass,
+# 'tflite' runs the published TFLite export selected by TFLITE_VARIANT, and 'shared' runs
+# the NumPy forward pass over weights memory-mapped from models/shared (one copy for all workers)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "keras")
+TFLITE_VARIANT = os.getenv("TFLITE_VARIANT", "int8")
+BACKENDS = ('keras', 'numpy', 'tflite', 'shared')
+
+class ModelArtifacts:
+    """Immutable snapshot of a model, its scaler and the grade mapping, loaded together."""
+
+    def __init__(self, model, scaler, grade_mapping, fingerprint, version, engine=None, backend=None, model_path=None):
+        self.model = model
+        self.scaler = scaler
+        self.grade_mapping = grade_mapping
+        self.fingerprint = fingerprint
+        self.version = version
+        self.engine = engine
+        self.backend = backend
+        self.model_path = model_path
+        self.loaded_at = time.time()
+
+    def predict_proba(self, X):
+        """Scale, clip and run the model over a (n_rows, 30) feature matrix."""
+        if self.engine is not None:
+            return self.engine.predict(X)
+        X_scaled = self.scaler.transform(X)
+        X_scaled = np.clip(X_scaled, -5, 5)
+        return self.model.predict(X_scaled, verbose=0)
+
+class ModelRegistry:
+    """Keep the serving artifacts in memory and reload them only when they change on disk."""
+
+    def __init__(self, model_path=MODEL_PATH, scaler_path=SCALER_PATH, mapping_path=MAPPING_PATH, backend=INFERENCE_BACKEND, tflite_variant=TFLITE_VARIANT):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend '{backend}'. Use one of {BACKENDS}")
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.mapping_path = mapping_path
+        self.backend = backend
+        self.tflite_variant = tflite_variant
+        # Served instead of a TFLite variant that is not published (rejected by the export gate)
+        self.fallback_path = model_path
+        if backend == 'tflite':
+            from src.export import tflite_path
+            self.model_path = tflite_path(tflite_variant, os.path.dirname(model_path))
+        self._artifacts = None
+        self._version = 0
+        self._last_error = None
+        self._lock = threading.Lock()
+
+    def _resolve(self):
+        """(model path, backend) to serve: the configured ones, or the Keras model if the TFLite variant is not published."""
+        if self.backend == 'tflite' and not os.path.exists(self.model_path):
+            return self.fallback_path, 'keras'
+        return self.model_path, self.backend
+
+    def _fingerprint(self):
+        """Return the resolved (path, backend) and (inode, mtime, size) of every artifact; raises FileNotFoundError if one is missing."""
+        model_path, backend = self._resolve()
+        fingerprint = [(model_path, backend)]
+        for path in (model_path, self.scaler_path, self.mapping_path):
+            stat = os.stat(path)
+            fingerprint.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        return tuple(fingerprint)
+
+    def _load(self, fingerprint):
+        """Load all artifacts and warm the model with a dummy forward pass."""
+        model_path, backend = fingerprint[0]
+        if backend != self.backend:
+            print(f"TFLite variant '{self.tflite_variant}' is not published ({self.model_path}); serving {model_path} with Keras")
+        with open(self.mapping_path, 'rb') as f:
+            categorical_mapping = joblib.load(f)
+        grade_mapping = categorical_mapping['GRADE']
+
+        model, scaler, engine = None, None, None
+        if backend == 'shared':
+            # The scaler is folded into the published weights; TensorFlow is only needed
+            # if this worker is the first to publish the current model version
+            from src.shared_weights import publish_weights, load_shared_model
+            engine = load_shared_model(publish_weights(model_path, self.scaler_path))
+        elif backend == 'tflite':
+            from src.export import TFLiteModel
+            with open(self.scaler_path, 'rb') as f:
+                scaler = joblib.load(f)
+            engine = TFLiteModel.from_file(model_path, scaler)
+        else:
+            import tensorflow as tf
+            with open(self.scaler_path, 'rb') as f:
+                scaler = joblib.load(f)
+            model = tf.keras.models.load_model(model_path)
+            if backend == 'numpy':
+                from src.inference import NumpyDenseModel
+                engine = NumpyDenseModel.from_keras(model, scaler)
+
+        artifacts = ModelArtifacts(model, scaler, grade_mapping, fingerprint, self._version + 1, engine, backend, model_path)
+        # Warm up so the first real request does not pay for graph tracing
+        artifacts.predict_proba(np.ones((1, NUM_FEATURES)))
+        return artifacts
+
+    def get(self):
+        """Return the current artifacts, reloading them if the files on disk have changed."""
+        artifacts = self._artifacts
+        try:
+            fingerprint = self._fingerprint()
+        except FileNotFoundError as e:
+            self._last_error = str(e)
+            # Keep serving the previous snapshot while an artifact is missing
+            if artifacts is not None:
+                return artifacts
+            raise
+        if artifacts is not None and artifacts.fingerprint == fingerprint:
+            return artifacts
+
+        with self._lock:
+            artifacts = self._artifacts
+            if artifacts is not None and artifacts.fingerprint == fingerprint:
+                return artifacts
+            try:
+                new_artifacts = self._load(fingerprint)
+            except Exception as e:
+                self._last_error = str(e)
+                # Keep serving the previous snapshot if a reload fails (e.g. a file is mid-write)
+                if artifacts is not None:
+                    print(f"Model reload failed, keeping version {artifacts.version}: {e}")
+                    return artifacts
+                raise
+            # Swap in the fully loaded snapshot in a single assignment
+            self._artifacts = new_artifacts
+            self._version = new_artifacts.version
+            self._last_error = None
+            print(f"Loaded model version {new_artifacts.version} from {new_artifacts.model_path}")
+            return new_artifacts
+
+    def current_version(self):
+        """Version of the loaded snapshot if it still matches the files on disk, else None.
+
+        Only stats the artifacts, so it never blocks on a reload.
+        """
+        artifacts = self._artifacts
+        try:
+            if artifacts is not None and artifacts.fingerprint == self._fingerprint():
+                return artifacts.version
+        except FileNotFoundError:
+            pass
+        return None
+
+    def warm_up(self):
+        """Load the artifacts eagerly (e.g. at application startup)."""
+        return self.get()
+
+    def is_ready(self) -> bool:
+        """Check if a model snapshot is loaded and can serve predictions."""
+        return self._artifacts is not None
+
+    @property
+    def version(self) -> int:
+        """Version counter of the loaded snapshot; increases on every reload."""
+        return self._version
+
+    def status(self) -> dict:
+        """Describe the registry state for health checks."""
+        artifacts = self._artifacts
+        return {
+            'ready': artifacts is not None,
+            'version': self._version,
+            'backend': self.backend,
+            # Differs from backend when an unpublished TFLite variant falls back to Keras
+            'serving_backend': artifacts.backend if artifacts is not None else None,
+            'model_path': artifacts.model_path if artifacts is not None else self.model_path,
+            'loaded_at': artifacts.loaded_at if artifacts is not None else None,
+            'last_error': self._last_error
+        }
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+def get_registry(model_path=MODEL_PATH, scaler_path=SCALER_PATH, mapping_path=MAPPING_PATH) -> ModelRegistry:
+    """Return the process-wide registry for the given artifact paths."""
+    key = (model_path, scaler_path, mapping_path)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = ModelRegistry(model_path, scaler_path, mapping_path)
+            _registries[key] = registry
+        return registry
@@ -0,0 +1,130 @@
+import functools
+import os
+import joblib
+import numpy as np
+import pandas as pd
+
+MAPPING_PATH = 'models/categorical_mapping.pkl'
+
+# Column order of the student dataset: STUDENTID, 31 coded features and the target
+FEATURE_COLUMNS = [
+    'STUDENTID', 'AGE', 'GENDER', 'HS_TYPE', 'SCHOLARSHIP', 'WORK', 'ACTIVITY', 'PARTNER',
+    'SALARY', 'TRANSPORT', 'LIVING', 'MOTHER_EDU', 'FATHER_EDU', '#_SIBLINGS',
+    'KIDS', 'MOTHER_JOB', 'FATHER_JOB', 'STUDY_HRS', 'READ_FREQ', 'READ_FREQ_SCI',
+    'ATTEND_DEPT', 'IMPACT', 'ATTEND', 'PREP_STUDY', 'PREP_EXAM', 'NOTES',
+    'LISTENS', 'LIKES_DISCUSS', 'CLASSROOM', 'CUML_GPA', 'EXP_GPA', 'COURSE ID'
+]
+TARGET_COLUMN = 'GRADE'
+COLUMNS = FEATURE_COLUMNS + [TARGET_COLUMN]
+KEY_COLUMN = 'STUDENTID'
+NUM_CLASSES = 8
+
+# Codes the source dataset uses beyond categorical_mapping: KIDS has a third code, and
+# EXP_GPA (not in the mapping) is on the same 1-5 scale as CUML_GPA
+RANGE_OVERRIDES = {'KIDS': (1, 3), 'EXP_GPA': (1, 5)}
+
+# Problems reported at most in a SchemaError message (the full report is on the exception)
+MAX_REPORTED_ERRORS = 10
+
+class SchemaError(ValueError):
+    """Data does not match the schema; errors holds the per-row report (row, column, value, error)."""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors
+
+class Schema:
+    """Compiled column order and allowed integer code range of every column.
+
+    errors() checks a whole frame or upload chunk with one vectorized range check per column
+    (integer columns need no NaN or fraction test, which keeps clean data cheap). Missing
+    values are allowed except for STUDENTID (features are imputed and rows without a grade
+    are dropped by the callers).
+    """
+
+    def __init__(self, ranges):
+        self.columns = list(COLUMNS)
+        self.ranges = {col: ranges[col] for col in COLUMNS if col != KEY_COLUMN}
+
+    def check_columns(self, df: pd.DataFrame, what: str = "Data") -> None:
+        """Raise SchemaError unless the frame has exactly the schema's columns, in order."""
+        if list(df.columns) != self.columns:
+            raise SchemaError(f"{what} must have columns: {self.columns}")
+
+    def errors(self, df: pd.DataFrame, first_row: int = 0) -> pd.DataFrame:
+        """Per-cell report of invalid values, ordered by row; empty if the frame is valid.
+
+        Works on any subset of the schema's columns. Rows are numbered by the frame's
+        (integer) index plus first_row, e.g. the CSV line number of the chunk's first row.
+        """
+        report = []
+        for col in df.columns:
+            if col == KEY_COLUMN:
+                missing = pd.isna(df[col].to_numpy())
+                report.extend((row, col, None, f"{KEY_COLUMN} is missing") for row in np.flatnonzero(missing).tolist())
+                continue
+            if col not in self.ranges:
+                continue
+            low, high = self.ranges[col]
+            values = df[col].to_numpy()
+            not_numeric = None
+            if values.dtype.kind in 'iub':
+                invalid = (values < low) | (values > high)
+            else:
+                if values.dtype.kind != 'f':
+                    coerced = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
+                    not_numeric = np.isnan(coerced) & ~pd.isna(values)
+                    values = coerced
+                # NaN fails every comparison, so missing values pass
+                invalid = (values < low) | (values > high) | (np.floor(values) != values) & ~np.isnan(values)
+                if not_numeric is not None:
+                    invalid |= not_numeric
+            for row in np.flatnonzero(invalid).tolist():
+                is_text = not_numeric is not None and not_numeric[row]
+                report.append((row, col, df[col].iat[row], self._describe(col, is_text)))
+
+        labels = np.asarray(df.index) if pd.api.types.is_integer_dtype(df.index) else np.arange(len(df))
+        errors = pd.DataFrame(report, columns=['row', 'column', 'value', 'error'])
+        errors['row'] = labels[errors['row'].to_numpy(dtype=np.int64)] + first_row
+        return errors.sort_values('row', kind='stable').reset_index(drop=True)
+
+    def _describe(self, column, not_numeric) -> str:
+        if not_numeric:
+            return f"{column} must be numeric"
+        low, high = self.ranges[column]
+        return f"{column} must be an integer from {low} to {high}"
+
+    def validate(self, df: pd.DataFrame, what: str = "Data", first_row: int = 0, row_name: str = "row") -> None:
+        """Raise SchemaError listing the first invalid values of the frame (see errors())."""
+        errors = self.errors(df, first_row)
+        if errors.empty:
+            return
+        shown = '; '.join(f"{row_name} {row}: {error}" for row, error in
+                          zip(errors['row'].head(MAX_REPORTED_ERRORS), errors['error'].head(MAX_REPORTED_ERRORS)))
+        plural = 's' if len(errors) > 1 else ''
+        raise SchemaError(f"{what} has {len(errors)} invalid value{plural} ({shown})", errors)
+
+    def check_read(self, source, df: pd.DataFrame, what: str = "Data") -> None:
+        """Validate data read from a raw CSV path; store splits and frames loaded from the store were
+        validated once at ingest and are not checked again (load_data_source checks MongoDB frames)."""
+        if isinstance(source, (str, os.PathLike)):
+            # Line 1 of the CSV is the header
+            self.validate(df, what, first_row=2, row_name="line")
+
+def compile_schema(categorical_mapping: dict) -> Schema:
+    """Build the schema from the categorical mapping: every coded column may hold its smallest to largest code."""
+    ranges = {col: (min(codes), max(codes)) for col, codes in categorical_mapping.items()}
+    ranges.update(RANGE_OVERRIDES)
+    missing = [col for col in COLUMNS if col != KEY_COLUMN and col not in ranges]
+    if missing:
+        raise ValueError(f"No value range for columns {missing}")
+    return Schema(ranges)
+
+@functools.lru_cache(maxsize=None)
+def get_schema(mapping_path: str = MAPPING_PATH) -> Schema:
+    """Process-wide schema compiled from the categorical mapping file."""
+    try:
+        with open(mapping_path, 'rb') as f:
+            return compile_schema(joblib.load(f))
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Categorical mapping not found at {mapping_path}")
@@ -0,0 +1,96 @@
+import glob
+import hashlib
+import json
+import os
+import joblib
+import numpy as np
+from src.inference import NumpyDenseModel
+
+# Directory holding one published weights file per model version
+SHARED_DIR = 'models/shared'
+# Published versions kept on disk; older ones are removed when a new version is published
+KEEP_VERSIONS = 3
+
+def artifact_version(model_path='models/model.keras', scaler_path='models/scaler.pkl'):
+    """Content hash of the model and scaler, identical in every worker process."""
+    digest = hashlib.sha256()
+    for path in (model_path, scaler_path):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def _paths(version, shared_dir):
+    base = os.path.join(shared_dir, f"weights-{version}")
+    return f"{base}.f32", f"{base}.json"
+
+def _write_atomic(path, data):
+    """Write next to the target and rename, so readers only ever see complete files."""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def publish_weights(model_path='models/model.keras', scaler_path='models/scaler.pkl', shared_dir=SHARED_DIR):
+    """Fold the scaler into the model weights and publish them as one flat float32 file.
+
+    The file is written once per model version (content hash of model and scaler) and is
+    never modified afterwards, so every worker can map it read-only and share the same
+    physical pages. Returns the published version.
+    """
+    version = artifact_version(model_path, scaler_path)
+    data_path, layout_path = _paths(version, shared_dir)
+    if os.path.exists(layout_path):
+        return version
+
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(model_path)
+    scaler = joblib.load(scaler_path)
+    engine = NumpyDenseModel.from_keras(model, scaler)
+
+    arrays = [engine.lower, engine.upper]
+    for kernel, bias in zip(engine.kernels, engine.biases):
+        arrays.extend([kernel, bias])
+    entries, offset = [], 0
+    for array in arrays:
+        entries.append({'offset': offset, 'shape': list(array.shape)})
+        offset += array.size
+    layout = {
+        'version': version,
+        'activations': engine.activations,
+        'arrays': entries
+    }
+
+    os.makedirs(shared_dir, exist_ok=True)
+    flat = np.concatenate([array.ravel() for array in arrays]).astype(np.float32)
+    # The layout is written last: its presence marks the weights file as complete
+    _write_atomic(data_path, flat.tobytes())
+    _write_atomic(layout_path, json.dumps(layout).encode('utf-8'))
+    print(f"Published shared weights version {version} to {data_path}")
+    _prune(shared_dir, keep=version)
+    return version
+
+def _prune(shared_dir, keep):
+    """Remove all but the newest KEEP_VERSIONS published versions (mapped files stay valid for readers)."""
+    layouts = sorted(glob.glob(os.path.join(shared_dir, 'weights-*.json')), key=os.path.getmtime, reverse=True)
+    for layout_path in layouts[KEEP_VERSIONS:]:
+        version = os.path.basename(layout_path)[len('weights-'):-len('.json')]
+        if version == keep:
+            continue
+        for path in _paths(version, shared_dir):
+            if os.path.exists(path):
+                os.remove(path)
+
+def load_shared_model(version, shared_dir=SHARED_DIR) -> NumpyDenseModel:
+    """Map a published weights file read-only and build a NumPy model over views of it (no copies)."""
+    data_path, layout_path = _paths(version, shared_dir)
+    with open(layout_path, 'r') as f:
+        layout = json.load(f)
+    buffer = np.memmap(data_path, dtype=np.float32, mode='r')
+    views = [
+        buffer[entry['offset']:entry['offset'] + int(np.prod(entry['shape']))].reshape(entry['shape'])
+        for entry in layout['arrays']
+    ]
+    lower, upper = views[0], views[1]
+    kernels, biases = views[2::2], views[3::2]
+    return NumpyDenseModel(kernels, biases, layout['activations'], lower, upper)
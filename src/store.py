@@ -0,0 +1,453 @@
+import json
+import os
+import shutil
+import threading
+from urllib.parse import quote
+import numpy as np
+import pandas as pd
+from src.schema import get_schema
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are still serialized within the process
+    fcntl = None
+
+# Root of the columnar dataset store and the splits it holds
+STORE_DIR = 'data/store'
+SPLITS = ('train', 'test')
+META_FILE = '_meta.json'
+INDEX_FILE = 'index.tsv'
+UPLOADS_FILE = 'uploads.jsonl'
+# Rows are identified by student; a student lives in exactly one split
+KEY_COLUMN = 'STUDENTID'
+
+class StudentIndex:
+    """Persistent index of where the current row of every student lives.
+
+    Maps STUDENTID to (split, partition, row, row hash). It is kept as an append-only
+    tab-separated log, one line per indexed row, and replayed into a dict: a later line for a
+    student replaces the earlier one. Other processes' appends are picked up by reading the
+    log from the last known offset, so lookups stay O(new rows) after startup.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # Ignore a trailing line another process is still writing
+        end = data.rfind(b'\n') + 1
+        names = {}
+        for line in data[:end].decode('utf-8').splitlines():
+            student_id, split, partition, row, row_hash = line.split('\t')
+            # Share one string object per split/partition name across entries
+            split = names.setdefault(split, split)
+            partition = names.setdefault(partition, partition)
+            self._entries[student_id] = (split, partition, int(row), int(row_hash))
+        self._offset += end
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def lookup(self, student_ids) -> list:
+        """Current (split, partition, row, row hash) of each student, or None if unknown."""
+        with self._lock:
+            self._refresh()
+            return [self._entries.get(student_id) for student_id in student_ids]
+
+    def add(self, entries):
+        """Append (student_id, split, partition, row, row_hash) entries in one write."""
+        if not entries:
+            return
+        if any('\t' in entry[0] or '\n' in entry[0] for entry in entries):
+            raise ValueError(f"{KEY_COLUMN} values must not contain tabs or line breaks")
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                for start in range(0, len(entries), 10000):
+                    lines = entries[start:start + 10000]
+                    f.write(''.join('\t'.join(map(str, entry)) + '\n' for entry in lines).encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            self._refresh()
+
+    def live_rows(self, split) -> dict:
+        """Row numbers of the current rows of a split, per partition."""
+        with self._lock:
+            self._refresh()
+            rows = {}
+            for entry_split, partition, row, _ in self._entries.values():
+                if entry_split == split:
+                    rows.setdefault(partition, []).append(row)
+            return {partition: np.sort(np.array(numbers, dtype=np.int64)) for partition, numbers in rows.items()}
+
+    def size(self) -> int:
+        """Bytes of the log (changes whenever entries are added)."""
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+class UploadRegistry:
+    """Append-only log (JSON lines) of the SHA-256 of every ingested upload and its ingest counts.
+
+    A content hash is honoured only while no later upload has updated existing students:
+    re-sending an older file after some of its students were changed must apply it again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._uploads = {}
+        self._count = 0
+        self._last_update = -1
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # Ignore a trailing line another process is still writing
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].decode('utf-8').splitlines():
+            record = json.loads(line)
+            self._uploads[record['sha256']] = (self._count, record['report'])
+            if record['report'].get('updated'):
+                self._last_update = self._count
+            self._count += 1
+        self._offset += end
+
+    def lookup(self, digest) -> dict:
+        """Counts of the earlier ingest of identical content, or None if it must be processed."""
+        with self._lock:
+            self._refresh()
+            entry = self._uploads.get(digest)
+            if entry is None or entry[0] < self._last_update:
+                return None
+            return dict(entry[1])
+
+    def add(self, digest, report):
+        """Record the counts of a committed upload."""
+        line = json.dumps({'sha256': digest, 'report': report}) + '\n'
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'ab') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                f.write(line.encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            self._refresh()
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """Content hash of every row, insensitive to int/float dtype differences of the same values."""
+    values = df.drop(columns=[KEY_COLUMN]).apply(pd.to_numeric, errors='coerce').astype('float64')
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+class ColumnarStore:
+    """Append-only columnar store of the train/test data.
+
+    Each split is a directory of partitions (part-00000, part-00001, ...), one per upload.
+    Only rows recorded in the StudentIndex are current: a student re-uploaded with changed
+    values gets a new row in a later partition and the old row is skipped by readers.
+    A partition holds one raw binary file per column plus _meta.json with the row count and
+    the name, file and NumPy dtype of every column (in order). Partitions are written to a
+    hidden temporary directory and renamed into place, so readers never see a partial
+    partition and an upload never rewrites old data.
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.index = StudentIndex(os.path.join(root, INDEX_FILE))
+        self.uploads = UploadRegistry(os.path.join(root, UPLOADS_FILE))
+        self._lock = threading.Lock()
+
+    def _split_dir(self, split):
+        if split not in SPLITS:
+            raise ValueError(f"Unknown split '{split}'. Use one of {SPLITS}")
+        return os.path.join(self.root, split)
+
+    def partitions(self, split) -> list:
+        """Names of the complete partitions of a split, oldest first."""
+        split_dir = self._split_dir(split)
+        if not os.path.isdir(split_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(split_dir)
+            if name.startswith('part-') and os.path.exists(os.path.join(split_dir, name, META_FILE))
+        )
+
+    def _meta(self, split, partition) -> dict:
+        with open(os.path.join(self._split_dir(split), partition, META_FILE), 'r') as f:
+            return json.load(f)
+
+    def num_rows(self, split) -> int:
+        """Number of current rows of a split."""
+        return sum(len(rows) for rows in self.index.live_rows(split).values())
+
+    def columns(self, split) -> list:
+        """Column names of a split (taken from its first partition)."""
+        partitions = self.partitions(split)
+        if not partitions:
+            return []
+        return [column['name'] for column in self._meta(split, partitions[0])['columns']]
+
+    def change_token(self) -> tuple:
+        """Cheap token that changes whenever a partition is appended or the index grows."""
+        return tuple(tuple(self.partitions(split)) for split in SPLITS) + (self.index.size(),)
+
+    def append(self, split, df: pd.DataFrame, partition=None) -> str:
+        """Write the frame as a new partition of the split and return the partition name.
+
+        The rows are visible to readers only once indexed (see commit). With an explicit
+        partition name, FileExistsError is raised if it already exists.
+        """
+        if df.empty:
+            raise ValueError("Cannot append an empty partition")
+        split_dir = self._split_dir(split)
+        os.makedirs(split_dir, exist_ok=True)
+        temp_dir = os.path.join(split_dir, f".part-{os.getpid()}-{threading.get_ident()}.tmp")
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+        try:
+            columns = []
+            for name in df.columns:
+                file_name = f"{quote(str(name), safe='')}.bin"
+                array = _column_array(df[name])
+                array.tofile(os.path.join(temp_dir, file_name))
+                columns.append({'name': name, 'file': file_name, 'dtype': array.dtype.str})
+            with open(os.path.join(temp_dir, META_FILE), 'w') as f:
+                json.dump({'rows': len(df), 'columns': columns}, f)
+
+            if partition is not None:
+                try:
+                    os.rename(temp_dir, os.path.join(split_dir, partition))
+                except OSError:
+                    raise FileExistsError(f"Partition {split}/{partition} already exists")
+                return partition
+
+            with self._lock:
+                existing = self.partitions(split)
+                number = int(existing[-1][len('part-'):]) + 1 if existing else 0
+                while True:
+                    partition = f"part-{number:05d}"
+                    try:
+                        os.rename(temp_dir, os.path.join(split_dir, partition))
+                        return partition
+                    except OSError:
+                        # Another process took this number first
+                        if not os.path.exists(os.path.join(split_dir, partition)):
+                            raise
+                        number += 1
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def read(self, split, columns=None, partitions=None) -> pd.DataFrame:
+        """Load the current rows of a split (or of the given partitions), optionally only some columns."""
+        live_rows = self.index.live_rows(split)
+        partitions = self.partitions(split) if partitions is None else list(partitions)
+        partitions = [partition for partition in partitions if partition in live_rows]
+        if not partitions:
+            return pd.DataFrame(columns=columns or [])
+        split_dir = self._split_dir(split)
+        available = [column['name'] for column in self._meta(split, partitions[0])['columns']]
+        columns = available if columns is None else list(columns)
+        missing = [name for name in columns if name not in available]
+        if missing:
+            raise ValueError(f"Columns not in the {split} data: {missing}")
+
+        parts = {name: [] for name in columns}
+        for partition in partitions:
+            meta = {column['name']: column for column in self._meta(split, partition)['columns']}
+            for name in columns:
+                # Only the requested column files are read; the dtype comes from the partition metadata
+                column = meta[name]
+                path = os.path.join(split_dir, partition, column['file'])
+                parts[name].append(np.fromfile(path, dtype=np.dtype(column['dtype']))[live_rows[partition]])
+        return pd.DataFrame({name: np.concatenate(arrays) for name, arrays in parts.items()}, columns=columns)
+
+    def transaction(self) -> 'StoreTransaction':
+        """Start a multi-partition write that becomes visible to readers only when committed."""
+        return StoreTransaction(self)
+
+    def discard(self, split, partition):
+        """Remove a partition that was written but never indexed."""
+        shutil.rmtree(os.path.join(self._split_dir(split), partition), ignore_errors=True)
+
+    def rebuild_index(self):
+        """Index the partitions of a store written before the index existed (the newest row of a student wins)."""
+        entries = []
+        for split in SPLITS:
+            split_dir = self._split_dir(split)
+            for partition in self.partitions(split):
+                meta = {column['name']: column for column in self._meta(split, partition)['columns']}
+                df = pd.DataFrame({
+                    name: np.fromfile(os.path.join(split_dir, partition, column['file']), dtype=np.dtype(column['dtype']))
+                    for name, column in meta.items()
+                })
+                entries.extend(_index_entries(split, partition, df))
+        # Keep a student in one split only: their newest row
+        latest = {}
+        for entry in entries:
+            latest[entry[0]] = entry
+        self.index.add(list(latest.values()))
+
+    def split(self, split) -> 'StoreSplit':
+        return StoreSplit(self, split)
+
+    def import_csv(self, split, csv_path) -> bool:
+        """Import a CSV as the first partition of an empty split; returns whether anything was imported."""
+        if self.partitions(split) or not os.path.exists(csv_path):
+            return False
+        try:
+            df = pd.read_csv(csv_path)
+        except pd.errors.EmptyDataError:
+            return False
+        if df.empty:
+            return False
+        # Validated once here; readers of the store trust its rows
+        schema = get_schema()
+        schema.check_columns(df, csv_path)
+        schema.check_read(csv_path, df, csv_path)
+        # Students repeated in the CSV (e.g. from re-uploads) are imported once, with the latest row
+        df = df.drop_duplicates(subset=[KEY_COLUMN], keep='last').reset_index(drop=True)
+        # ...and only into one split
+        df = df[[location is None for location in self.index.lookup(df[KEY_COLUMN].astype(str).tolist())]]
+        if df.empty:
+            return False
+        try:
+            # A fixed name, so concurrent workers bootstrapping the same store import only once
+            self.append(split, df, partition='part-00000')
+        except FileExistsError:
+            return False
+        self.index.add(_index_entries(split, 'part-00000', df))
+        print(f"Imported {csv_path} into the {split} split of {self.root}")
+        return True
+
+class StoreTransaction:
+    """Write uploaded rows chunk by chunk and publish them in one step.
+
+    Each write() appends partitions immediately, but their index entries are staged until
+    commit(), which is the point where the rows become visible. On an error (or rollback())
+    the partitions written so far are removed. Lookups see the staged rows first, so a
+    student repeated across chunks stays in one split. Used as a context manager, the
+    transaction commits on success and rolls back on an exception.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.partitions = {split: [] for split in SPLITS}
+        self._staged = {}
+        self._known = set()
+
+    def classify(self, df: pd.DataFrame):
+        """Sort rows (unique STUDENTIDs) against the staged rows and the index.
+
+        Returns (new_rows, updated_rows, skipped): rows of unknown students, a dict of rows of
+        known students whose values changed keyed by the split they live in, and the number
+        of rows identical to the current ones.
+        """
+        hashes = row_hashes(df)
+        student_ids = df[KEY_COLUMN].astype(str).tolist()
+        indexed = self.store.index.lookup([student_id for student_id in student_ids if student_id not in self._staged])
+        indexed = iter(indexed)
+        locations = []
+        for student_id in student_ids:
+            if student_id in self._staged:
+                locations.append(self._staged[student_id][1:])
+            else:
+                location = next(indexed)
+                if location is not None:
+                    self._known.add(student_id)
+                locations.append(location)
+        is_new = np.array([location is None for location in locations], dtype=bool)
+        is_same = np.array([location is not None and location[3] == int(row_hash)
+                            for location, row_hash in zip(locations, hashes)], dtype=bool)
+        splits = np.array([location[0] if location is not None else '' for location in locations])
+        updated_rows = {split: df[~is_new & ~is_same & (splits == split)] for split in SPLITS}
+        return df[is_new], updated_rows, int(is_same.sum())
+
+    def write(self, split, df: pd.DataFrame):
+        """Append the rows as a new partition of the split and stage their index entries."""
+        if df.empty:
+            return None
+        partition = self.store.append(split, df)
+        self.partitions[split].append(partition)
+        for entry in _index_entries(split, partition, df):
+            self._staged[entry[0]] = entry
+        return partition
+
+    def counts(self) -> dict:
+        """Students inserted (unknown before) and updated (changed) by this transaction."""
+        updated = sum(1 for student_id in self._staged if student_id in self._known)
+        return {'inserted': len(self._staged) - updated, 'updated': updated}
+
+    def commit(self):
+        self.store.index.add(list(self._staged.values()))
+
+    def rollback(self):
+        for split, partitions in self.partitions.items():
+            for partition in partitions:
+                self.store.discard(split, partition)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+class StoreSplit:
+    """One split of a store, accepted wherever a CSV path or DataFrame is (see preprocessing.read_data)."""
+
+    def __init__(self, store, split):
+        self.store = store
+        self.name = split
+
+    def read(self, columns=None) -> pd.DataFrame:
+        return self.store.read(self.name, columns)
+
+    def __repr__(self):
+        return f"{self.store.root}/{self.name}"
+
+def _index_entries(split, partition, df) -> list:
+    hashes = row_hashes(df)
+    return [(student_id, split, partition, row, int(row_hash))
+            for row, (student_id, row_hash) in enumerate(zip(df[KEY_COLUMN].astype(str), hashes))]
+
+def _column_array(series: pd.Series) -> np.ndarray:
+    """Numeric columns keep their dtype; anything else is stored as fixed-width unicode."""
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series.to_numpy()
+    return series.astype(str).to_numpy().astype(str)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(root=STORE_DIR, train_path='data/train/train.csv', test_path='data/test/test.csv') -> ColumnarStore:
+    """Return the process-wide store at root, importing the CSVs into empty splits on first use."""
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = ColumnarStore(root)
+            if not store.index.exists() and (store.partitions('train') or store.partitions('test')):
+                store.rebuild_index()
+            store.import_csv('train', train_path)
+            store.import_csv('test', test_path)
+            _stores[root] = store
+        return store
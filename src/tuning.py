@@ -0,0 +1,189 @@
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+# Values explored by the search; units lists the widths of the hidden Dense layers
+SEARCH_SPACE = {
+    'units': [(16, 32), (32, 32), (32, 64), (64, 64), (64, 128), (128, 64)],
+    'learning_rate': [3e-4, 1e-3, 3e-3],
+    'batch_size': [32, 64, 128],
+    'epochs': [30, 60, 100]
+}
+TUNING_DIR = os.getenv("TUNING_DIR", "models/tuning")
+# Parallel trials; each worker runs a single-threaded TensorFlow, so one per available core
+TUNING_WORKERS = int(os.getenv("TUNING_WORKERS", "0")) or (
+    len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+)
+# Median pruning: from PRUNE_WARMUP_EPOCHS on, every PRUNE_INTERVAL epochs a trial whose best
+# validation accuracy so far is below the median of other trials at the same epoch is stopped
+# (once at least PRUNE_MIN_TRIALS others have reached that epoch)
+PRUNE_WARMUP_EPOCHS = int(os.getenv("PRUNE_WARMUP_EPOCHS", "10"))
+PRUNE_INTERVAL = int(os.getenv("PRUNE_INTERVAL", "5"))
+PRUNE_MIN_TRIALS = int(os.getenv("PRUNE_MIN_TRIALS", "3"))
+
+# Per-worker state, set by _init_worker
+_worker = {}
+
+def trial_id(config) -> str:
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12]
+
+def sample_configs(n_trials, seed=0, space=None) -> list:
+    """Draw n_trials distinct configurations from the search space (the whole grid if it is smaller).
+
+    The draw is deterministic for a given seed, so rerunning a search resumes the same trials.
+    """
+    space = space or SEARCH_SPACE
+    keys = sorted(space)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+    random.Random(seed).shuffle(grid)
+    return [{**config, 'units': list(config['units'])} for config in grid[:n_trials]]
+
+def data_digest(*arrays) -> str:
+    digest = hashlib.sha256()
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()[:16]
+
+def load_trials(log_path) -> list:
+    """Read the trial log, skipping a truncated last line from an interrupted run."""
+    trials = []
+    if os.path.exists(log_path):
+        with open(log_path) as f:
+            for line in f:
+                try:
+                    trials.append(json.loads(line))
+                except ValueError:
+                    pass
+    return trials
+
+def _init_worker(data_path, curves):
+    # Single-threaded TensorFlow, configured before it is first imported in this process
+    os.environ["TF_NUM_INTRAOP_THREADS"] = "1"
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    os.environ["OMP_NUM_THREADS"] = "1"
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(1)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    with np.load(data_path) as data:
+        _worker['arrays'] = {key: data[key] for key in data.files}
+    _worker['curves'] = curves
+
+def _make_pruning_callback(trial, curves):
+    import tensorflow as tf
+
+    class MedianPruning(tf.keras.callbacks.Callback):
+        """Publish the validation accuracy curve and stop the trial if it falls below the median."""
+
+        def on_train_begin(self, logs=None):
+            self.curve = []
+            self.pruned_at = None
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.curve.append(float((logs or {}).get('val_accuracy', 0.0)))
+            curves[trial] = self.curve
+            done = epoch + 1
+            if done < PRUNE_WARMUP_EPOCHS or (done - PRUNE_WARMUP_EPOCHS) % PRUNE_INTERVAL:
+                return
+            others = [max(curve[:done]) for other, curve in curves.items() if other != trial and len(curve) >= done]
+            if len(others) >= PRUNE_MIN_TRIALS and max(self.curve) < statistics.median(others):
+                self.pruned_at = done
+                self.model.stop_training = True
+
+    return MedianPruning()
+
+def run_trial(config, tuning_dir, seed=42) -> dict:
+    """Train one configuration in a worker process; returns its trial record."""
+    import tensorflow as tf
+    from src.model import create_model, _fit
+
+    trial = trial_id(config)
+    record = {'trial_id': trial, 'config': config, 'data': _worker['arrays']['digest'].item()}
+    started = time.perf_counter()
+    try:
+        arrays = _worker['arrays']
+        X_train, y_train, X_val, y_val = arrays['X_train'], arrays['y_train'], arrays['X_val'], arrays['y_val']
+        class_weight = dict(enumerate(arrays['class_weight'])) if arrays['class_weight'].size else None
+        tf.keras.utils.set_random_seed(seed)
+        model = create_model(X_train.shape[1], y_train.shape[1], config['units'], config['learning_rate'])
+        pruning = _make_pruning_callback(trial, _worker['curves'])
+        history = _fit(model, X_train, y_train, config['epochs'], config['batch_size'], X_val, y_val,
+                       [pruning], class_weight, verbose=0)
+        record.update({
+            'status': 'pruned' if pruning.pruned_at else 'complete',
+            'epochs_run': len(pruning.curve),
+            'val_accuracy': history.history['val_accuracy'][-1],
+            'val_loss': history.history['val_loss'][-1],
+            'curve': pruning.curve
+        })
+        if not pruning.pruned_at:
+            model.save(os.path.join(tuning_dir, 'trials', f"{trial}.keras"))
+    except Exception as e:
+        record.update({'status': 'failed', 'error': str(e)})
+    record['seconds'] = time.perf_counter() - started
+    return record
+
+def _best(trials) -> dict:
+    complete = [trial for trial in trials if trial['status'] == 'complete']
+    if not complete:
+        return None
+    return max(complete, key=lambda trial: (trial['val_accuracy'], -trial['val_loss']))
+
+def run_search(X_train, y_train, X_val, y_val, n_trials=20, workers=None, tuning_dir=None, seed=0, class_weight=None,
+               space=None) -> dict:
+    """Search hyperparameters of create_model and its training over a process pool.
+
+    Every finished trial is appended to <tuning_dir>/trials.jsonl; rerunning with the same
+    data, seed and n_trials skips the trials already logged. The best complete trial (by
+    final validation accuracy, then loss) is written to best_config.json and its model to
+    best_model.keras. Returns the best trial record and all records of this data.
+    """
+    try:
+        tuning_dir = tuning_dir or TUNING_DIR
+        os.makedirs(os.path.join(tuning_dir, 'trials'), exist_ok=True)
+        log_path = os.path.join(tuning_dir, 'trials.jsonl')
+        digest = data_digest(X_train, y_train, X_val, y_val)
+        trials = [trial for trial in load_trials(log_path) if trial.get('data') == digest]
+        done = {trial['trial_id'] for trial in trials}
+        pending = [config for config in sample_configs(n_trials, seed, space) if trial_id(config) not in done]
+        print(f"Tuning: {len(pending)} trials to run, {len(done)} already logged")
+
+        if pending:
+            data_path = os.path.join(tuning_dir, 'data.npz')
+            weights = np.array([class_weight[i] for i in sorted(class_weight)]) if class_weight else np.array([])
+            np.savez(data_path, X_train=X_train, y_train=y_train, X_val=X_val, y_val=y_val,
+                     class_weight=weights, digest=np.array(digest))
+            context = multiprocessing.get_context('spawn')
+            with context.Manager() as manager:
+                # Validation curves of all trials, seeded from the log so resumed runs prune as before
+                curves = manager.dict({trial['trial_id']: trial['curve'] for trial in trials if trial.get('curve')})
+                workers = min(workers or TUNING_WORKERS, len(pending))
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                         initargs=(data_path, curves)) as executor:
+                    futures = [executor.submit(run_trial, config, tuning_dir) for config in pending]
+                    with open(log_path, 'a') as log:
+                        for future in as_completed(futures):
+                            record = future.result()
+                            log.write(json.dumps(record) + "\n")
+                            log.flush()
+                            trials.append(record)
+                            print(f"Trial {record['trial_id']} {record['status']}: {record['config']} "
+                                  f"val_accuracy={record.get('val_accuracy', float('nan')):.4f} ({record['seconds']:.1f}s)")
+            os.remove(data_path)
+
+        best = _best(trials)
+        if best is None:
+            raise ValueError("No trial completed")
+        shutil.copy(os.path.join(tuning_dir, 'trials', f"{best['trial_id']}.keras"), os.path.join(tuning_dir, 'best_model.keras'))
+        with open(os.path.join(tuning_dir, 'best_config.json'), 'w') as f:
+            json.dump(best, f, indent=2)
+        return {'best': best, 'trials': trials}
+    except Exception as e:
+        raise Exception(f"Error during hyperparameter search: {e}")
@@ -1,7 +1,7 @@
-import pandas as pd
 import numpy as np
-from sklearn.metrics import confusion_matrix
 import joblib
+from src.preprocessing import read_data
+from src.schema import get_schema
 
 # Define the full set of original columns
 all_columns_names = [
@@ -57,19 +57,12 @@ def get_available_features():
     return [categorical_name_mapping[col] for col in all_columns_names if col != 'STUDENTID']
 
 def generate_plot_data(data_path, plot_type='scatter', features=None):
-    """Generate JSON-compatible data for interactive plots of the student dataset."""
-    try:
-        data = pd.read_csv(data_path)
-        expected_columns = all_columns_names
-        if list(data.columns) != expected_columns:
-            raise ValueError(f"Input data must have columns: {expected_columns}")
-
-        data = data.drop(columns=['STUDENTID'])
-        grade_names = {0: 'Fail', 1: 'DD', 2: 'DC', 3: 'CC', 4: 'CB', 5: 'BB', 6: 'BA', 7: 'AA'}
-        if not set(data[target_col]).issubset(set(range(8))):
-            raise ValueError("Target column must contain integers 0-7 for grade classes.")
-        data['grade_label'] = data[target_col].map(grade_names)
+    """Generate JSON-compatible data for interactive plots of the student dataset.
 
+    data_path may be a CSV path, an in-memory DataFrame (which is not modified) or a store
+    split; CSVs and store splits are read for the plotted columns only.
+    """
+    try:
         available_features = [col for col in all_columns_names if col != 'STUDENTID']
         if features is None or not features:
             features = [categorical_name_mapping[col] for col in available_features]
@@ -79,6 +72,15 @@ def generate_plot_data(data_path, plot_type='scatter', features=None):
             if None in technical_features or not all(f in available_features for f in technical_features):
                 raise ValueError(f"Features must be in {get_available_features()}")
 
+        # Load only the plotted features and the target
+        columns = list(dict.fromkeys([reverse_mapping[f] for f in features] + [target_col]))
+        data = read_data(data_path, columns)
+
+        get_schema().check_read(data_path, data, "Plot data")
+
+        grade_names = {0: 'Fail', 1: 'DD', 2: 'DC', 3: 'CC', 4: 'CB', 5: 'BB', 6: 'BA', 7: 'AA'}
+        data = data.assign(grade_label=data[target_col].map(grade_names))
+
         if plot_type == 'scatter':
             if len(features) < 2:
                 raise ValueError("Scatter plot requires at least 2 features.")
@@ -155,6 +157,8 @@ def generate_plot_data(data_path, plot_type='scatter', features=None):
 
 def generate_confusion_matrix_data(y_true, y_pred, mapping_path='models/categorical_mapping.pkl'):
     """Generate confusion matrix data for plotting."""
+    from sklearn.metrics import confusion_matrix
+
     try:
         with open(mapping_path, 'rb') as f:
             categorical_mapping = joblib.load(f)
@@ -530,7 +530,7 @@ document.addEventListener("DOMContentLoaded", () => {
             });
     });
 
-    // Handle retrain
+    // Handle retrain: start a background job, then poll its status until it finishes
     retrainButton.addEventListener("click", () => {
         showLoading("Retraining model...");
         retrainResult.innerHTML = "<p>Retraining model...</p>";
@@ -541,11 +541,16 @@ document.addEventListener("DOMContentLoaded", () => {
             body: JSON.stringify({}) // Send empty JSON object instead of undefined
         })
             .then(response => {
+                if (response.status === 409) {
+                    // A retrain is already running: follow that job instead
+                    return response.json().then(data => data.detail.job);
+                }
                 if (!response.ok) {
                     throw new Error(`HTTP error! Status: ${response.status}`);
                 }
                 return response.json();
             })
+            .then(job => pollRetrainJob(job.job_id))
             .then(data => {
                 // Create model comparison cards
                 const comparison = document.createElement("div");
@@ -583,6 +588,35 @@ document.addEventListener("DOMContentLoaded", () => {
             });
     });
 
+    // Poll a retrain job every 2 seconds, showing epoch progress, until it succeeds or fails
+    function pollRetrainJob(jobId) {
+        return new Promise((resolve, reject) => {
+            const poll = () => {
+                fetch(`/api/retrain/${jobId}`)
+                    .then(response => {
+                        if (!response.ok) {
+                            throw new Error(`HTTP error! Status: ${response.status}`);
+                        }
+                        return response.json();
+                    })
+                    .then(job => {
+                        if (job.status === "succeeded") {
+                            resolve(job.result);
+                        } else if (job.status === "failed") {
+                            reject(new Error(job.error));
+                        } else {
+                            const progress = job.progress || {};
+                            const epochText = progress.epoch ? ` (epoch ${progress.epoch}/${progress.epochs})` : "";
+                            retrainResult.innerHTML = `<p>Retraining model: ${(progress.phase || job.status).replace(/_/g, " ")}${epochText}...</p>`;
+                            setTimeout(poll, 2000);
+                        }
+                    })
+                    .catch(reject);
+            };
+            poll();
+        });
+    }
+
     // Handle evaluate
     evaluateButton.addEventListener("click", () => {
         showLoading("Evaluating model...");
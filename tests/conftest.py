@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+from src.database import Database
+from src.store import ColumnarStore
+
+pytest.importorskip("mongomock")
+from tests.mongomock_compat import mongomock_client  # noqa: E402
+
+TRAIN_CSV = "data/train/train.csv"
+
+@pytest.fixture
+def rows():
+    """A few valid rows of the training data."""
+    return pd.read_csv(TRAIN_CSV).head(10)
+
+@pytest.fixture
+def client():
+    return mongomock_client()
+
+@pytest.fixture
+def database(client):
+    database = Database(client=client, database_name="student_grade_db_test")
+    assert database.connect()
+    return database
+
+@pytest.fixture
+def store(tmp_path, rows):
+    """A columnar store holding the sample rows split into train and test."""
+    store = ColumnarStore(root=str(tmp_path / "store"))
+    for split, frame in (('train', rows.iloc[:7]), ('test', rows.iloc[7:])):
+        path = tmp_path / f"{split}.csv"
+        frame.to_csv(path, index=False)
+        store.import_csv(split, str(path))
+    return store
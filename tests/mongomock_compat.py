@@ -0,0 +1,22 @@
+"""mongomock client for tests and benchmarks that run without a MongoDB server."""
+import mongomock
+import mongomock.collection
+
+def _patch_bulk_sort():
+    # mongomock 4.3 does not accept the `sort` option pymongo >= 4.9 passes for bulk replace/update
+    builder = mongomock.collection.BulkOperationBuilder
+    if getattr(builder, '_accepts_sort', False):
+        return
+    for name in ('add_replace', 'add_update'):
+        original = getattr(builder, name)
+
+        def without_sort(self, *args, _original=original, sort=None, **kwargs):
+            return _original(self, *args, **kwargs)
+
+        setattr(builder, name, without_sort)
+    builder._accepts_sort = True
+
+def mongomock_client() -> mongomock.MongoClient:
+    """An in-process MongoClient that accepts the bulk writes of src.database."""
+    _patch_bulk_sort()
+    return mongomock.MongoClient()
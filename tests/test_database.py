@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+import src.database
+import src.dataset
+from src.database import Database, KEY_COLUMN
+from src.dataset import sync_database
+
+def test_upsert_inserts_then_updates_changed_rows(database, rows):
+    assert database.upsert_to_collection(rows, 'train') == {'inserted': 10, 'updated': 0, 'unchanged': 0}
+    # Repeating the same rows is a no-op
+    assert database.upsert_to_collection(rows, 'train', batch_size=3) == {'inserted': 0, 'updated': 0, 'unchanged': 10}
+
+    changed = rows.head(3).copy()
+    changed.loc[0, 'AGE'] = changed.loc[0, 'AGE'] + 1
+    changed.loc[2, KEY_COLUMN] = 'NEW-STUDENT'
+    assert database.upsert_to_collection(changed, 'train') == {'inserted': 1, 'updated': 1, 'unchanged': 1}
+    assert database.count_documents('train') == 11
+    stored = database.db['train'].find_one({KEY_COLUMN: rows.loc[0, KEY_COLUMN]})
+    assert stored['AGE'] == rows.loc[0, 'AGE'] + 1
+
+def test_upsert_keeps_last_row_of_repeated_student(database, rows):
+    repeated = rows.head(2).copy()
+    repeated[KEY_COLUMN] = 'SAME-STUDENT'
+    repeated['GRADE'] = [1, 6]
+    assert database.upsert_to_collection(repeated, 'test')['inserted'] == 1
+    assert database.db['test'].find_one({KEY_COLUMN: 'SAME-STUDENT'})['GRADE'] == 6
+
+def test_ensure_indexes_creates_unique_student_index(database):
+    for collection in ('train', 'test'):
+        index = database.db[collection].index_information()[f"{KEY_COLUMN}_1"]
+        assert index['unique']
+    assert database.status()['index_errors'] == {}
+
+def _with_duplicates(client, rows):
+    # A collection written before the unique index existed
+    client["student_grade_db_test"]['train'].insert_many(
+        [rows.iloc[0].to_dict(), {**rows.iloc[0].to_dict(), 'GRADE': 7}]
+    )
+    return Database(client=client, database_name="student_grade_db_test")
+
+def test_ensure_indexes_keeps_duplicates_by_default(client, rows):
+    database = _with_duplicates(client, rows)
+    assert database.connect()
+    assert 'train' in database.status()['index_errors']
+    assert database.count_documents('train') == 2
+
+def test_ensure_indexes_drops_older_duplicates_when_enabled(client, rows, monkeypatch):
+    monkeypatch.setattr(src.database, 'DROP_DUPLICATE_KEYS', True)
+    database = _with_duplicates(client, rows)
+    assert database.connect()
+    assert database.status()['index_errors'] == {}
+    documents = list(database.db['train'].find({}))
+    assert len(documents) == 1 and documents[0]['GRADE'] == 7
+
+@pytest.fixture
+def synced_db(database, monkeypatch):
+    """Point src.dataset at the mongomock database with nothing synced yet."""
+    monkeypatch.setattr(src.dataset, 'db', database)
+    src.dataset.mongo_synced.clear()
+    yield database
+    src.dataset.mongo_synced.clear()
+
+def test_sync_database_writes_only_unsynced_partitions(synced_db, store, rows):
+    report = asyncio.run(sync_database(store))
+    assert report == {
+        'train': {'inserted': 7, 'updated': 0, 'unchanged': 0},
+        'test': {'inserted': 3, 'updated': 0, 'unchanged': 0}
+    }
+    assert src.dataset.mongo_synced.is_set()
+    assert asyncio.run(sync_database(store)) == {}
+
+    # An upload: one changed student and one new one
+    upload = rows.head(2).copy()
+    upload.loc[0, 'AGE'] = upload.loc[0, 'AGE'] + 1
+    upload.loc[1, KEY_COLUMN] = 'NEW-STUDENT'
+    with store.transaction() as transaction:
+        transaction.write('train', upload)
+    assert asyncio.run(sync_database(store)) == {'train': {'inserted': 1, 'updated': 1, 'unchanged': 0}}
+    assert synced_db.count_documents('train') == 8
+    assert synced_db.db['meta'].find_one({'_id': 'data_version'})['value'] == 2
+
+def test_failed_sync_is_retried_by_next_sync(synced_db, store, monkeypatch):
+    def fail(*args, **kwargs):
+        raise src.database.PyMongoError("write failed")
+
+    src.dataset.mongo_synced.set()
+    monkeypatch.setattr(synced_db, 'upsert_to_collection', fail)
+    with pytest.raises(src.database.PyMongoError):
+        asyncio.run(sync_database(store))
+    # Reads fall back to the store until MongoDB has caught up
+    assert not src.dataset.mongo_synced.is_set()
+
+    monkeypatch.delattr(synced_db, 'upsert_to_collection')
+    assert set(asyncio.run(sync_database(store))) == {'train', 'test'}
+    assert src.dataset.mongo_synced.is_set()
+
+def test_load_data_source_rejects_invalid_mongodb_grades(synced_db, store, rows):
+    asyncio.run(sync_database(store))
+    train, test = src.dataset.load_data_source(store)
+    assert len(train) == 7 and len(test) == 3
+
+    # A document written by another tool, with a grade outside the 8 classes
+    synced_db.db['train'].insert_one({**rows.iloc[0].to_dict(), KEY_COLUMN: 'OTHER-TOOL', 'GRADE': -1})
+    train, _ = src.dataset.load_data_source(store)
+    assert 'OTHER-TOOL' not in set(train[KEY_COLUMN])
+    assert len(train) == 7
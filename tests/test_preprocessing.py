@@ -0,0 +1,11 @@
+import numpy as np
+import pytest
+from src.preprocessing import to_categorical
+
+def test_to_categorical_one_hot_encodes_labels():
+    assert to_categorical(np.array([0, 7, 3.0]), 8).argmax(axis=1).tolist() == [0, 7, 3]
+
+@pytest.mark.parametrize('label', [-1, 8, 2.5, np.nan])
+def test_to_categorical_rejects_invalid_labels(label):
+    with pytest.raises(ValueError, match="integers from 0 to 7"):
+        to_categorical(np.array([1, label]), 8)
@@ -0,0 +1,42 @@
+"""Search layer widths, learning rate, batch size and epochs of the grade model in parallel.
+
+Usage: python tune.py [--trials 20] [--workers N] [--seed 0] [--dir models/tuning]
+Trains on the training split of the dataset store (preprocessed as for /api/retrain) with one
+single-threaded TensorFlow worker per core, pruning trials that fall behind on validation
+accuracy. Trials are logged to <dir>/trials.jsonl, so an interrupted search resumes where it
+stopped; the best configuration and model are written to <dir>/best_config.json and
+<dir>/best_model.keras. The scaler and imputation modes fitted for the search are saved to
+<dir>/scaler.pkl and <dir>/modes.pkl (best_model.keras expects inputs scaled by them); the
+served models/scaler.pkl and modes.pkl are left untouched.
+"""
+import argparse
+import os
+from src.preprocessing import preprocess_train_data, training_class_weight
+from src.store import get_store
+from src.tuning import run_search, TUNING_DIR, TUNING_WORKERS
+
+def main(args):
+    os.makedirs(args.dir, exist_ok=True)
+    X_train, y_train, X_val, y_val = preprocess_train_data(get_store().split('train'),
+                                                           scaler_path=os.path.join(args.dir, 'scaler.pkl'),
+                                                           modes_path=os.path.join(args.dir, 'modes.pkl'),
+                                                           save_dir=args.dir)
+    result = run_search(X_train, y_train, X_val, y_val, n_trials=args.trials, workers=args.workers,
+                        tuning_dir=args.dir, seed=args.seed, class_weight=training_class_weight(y_train))
+
+    print(f"{'trial':<13} {'status':<9} {'units':<10} {'lr':>7} {'batch':>6} {'epochs':>7} {'val acc':>8} {'seconds':>8}")
+    for trial in sorted(result['trials'], key=lambda trial: -trial.get('val_accuracy', -1)):
+        config = trial['config']
+        print(f"{trial['trial_id']:<13} {trial['status']:<9} {'/'.join(map(str, config['units'])):<10} "
+              f"{config['learning_rate']:>7g} {config['batch_size']:>6} {trial.get('epochs_run', 0):>3}/{config['epochs']:<3} "
+              f"{trial.get('val_accuracy', float('nan')):>8.4f} {trial['seconds']:>8.1f}")
+    print(f"Best configuration: {result['best']['config']} -> {args.dir}/best_model.keras "
+          f"(inputs scaled with {args.dir}/scaler.pkl and {args.dir}/modes.pkl)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=TUNING_WORKERS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dir", default=TUNING_DIR)
+    main(parser.parse_args())